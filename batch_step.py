@@ -0,0 +1,163 @@
+import numpy as np
+
+import constants
+from constants import ENERGY_FROM_MOVING, ENERGY_FROM_MATING, REWARD_FROM_MOVING, REWARD_FROM_EATING, \
+    REWARD_FROM_MATING, REWARD_FROM_DYING
+from organism import Organism
+from world import EMPTY, ORGANISM
+from profiler import PROFILER
+
+# Row and column change of the up, left, right and down neighbours, in action order
+DIRECTION_ROWS = np.array([0, -1, 1, 0])
+DIRECTION_COLUMNS = np.array([-1, 0, 0, 1])
+DO_NOTHING = 12
+# Rounds of conflict resolution before the remaining organisms do nothing
+MAX_ROUNDS = 8
+
+
+def random_step(world):
+    """
+    Let every living organism in the world take one random action, all at once.
+
+    Each round, every pending organism draws uniformly from the actions that are valid
+    for its surroundings, which is what Organism.random_action converges to. An action
+    claims the organism's cell and its target cell. Organisms earlier in row major order
+    win conflicting claims, and the losers draw again in the next round against the
+    updated world. Transitions are passed to Organism.remember like random_action does.
+    """
+    _random_rounds(world, world.living_slots())
+    world.collect()
+    return world
+
+
+def _random_rounds(world, pending):
+    """
+    The rounds of random_step for the organisms in pending, which act in that order
+    """
+    rank = np.zeros(world.slots_used, dtype=np.int64)
+    rank[pending] = np.arange(len(pending))
+
+    for _ in range(MAX_ROUNDS):
+        if len(pending) == 0:
+            break
+        rows = world.row[pending]
+        columns = world.column[pending]
+        visible_tiles = world.observations(rows, columns)
+
+        # Valid actions from the four neighbours: move into empty, eat anything, mate with
+        # organisms if there is room for a baby
+        target_rows = rows[:, None] + DIRECTION_ROWS
+        target_columns = columns[:, None] + DIRECTION_COLUMNS
+        neighbours = world.cell_types(target_rows, target_columns)
+        valid = np.concatenate([neighbours == EMPTY, neighbours > EMPTY,
+                                (neighbours == ORGANISM) & (world.free_count > 0)], axis=1)
+        keys = np.random.random(valid.shape)
+        keys[~valid] = -1
+        actions = keys.argmax(axis=1)
+        stuck = ~valid.any(axis=1)
+        _remember(world, pending[stuck], visible_tiles[stuck], np.full(stuck.sum(), DO_NOTHING),
+                  np.zeros(stuck.sum()), visible_tiles[stuck])
+
+        acting = ~stuck
+        slots = pending[acting]
+        actions = actions[acting]
+        direction = actions % 4
+        target_rows = target_rows[acting, direction]
+        target_columns = target_columns[acting, direction]
+        visible_tiles = visible_tiles[acting]
+
+        # Each cell goes to the lowest ranked organism claiming it
+        own_cells = world.row[slots].astype(np.int64) * world.grid_size + world.column[slots]
+        target_cells = target_rows.astype(np.int64) * world.grid_size + target_columns
+        wins = _claim_winners(own_cells, target_cells, rank[slots])
+
+        slots, actions = slots[wins], actions[wins]
+        target_rows, target_columns = target_rows[wins], target_columns[wins]
+        visible_tiles = visible_tiles[wins]
+        acted, rewards = _apply_actions(world, slots, actions, target_rows, target_columns)
+
+        slots = slots[acted]
+        new_visible_tiles = world.observations(world.row[slots], world.column[slots])
+        _remember(world, slots, visible_tiles[acted], actions[acted], rewards[acted], new_visible_tiles)
+
+        # Losers that were not eaten this round try again, as do organisms left without room for a baby
+        deferred = np.concatenate([pending[acting][~wins], pending[acting][wins][~acted]])
+        pending = deferred[world.on_grid[deferred]]
+        PROFILER.count("action_retries", len(pending))
+
+    if len(pending) > 0:
+        visible_tiles = world.observations(world.row[pending], world.column[pending])
+        _remember(world, pending, visible_tiles, np.full(len(pending), DO_NOTHING),
+                  np.zeros(len(pending)), visible_tiles)
+
+
+def _claim_winners(own_cells, target_cells, ranks):
+    """
+    Which organisms have the lowest rank of everyone claiming their own or their target cell.
+    Sorts the claims rather than using an array the size of the grid, so the cost follows
+    the number of organisms and not the grid size
+    """
+    cells = np.concatenate([own_cells, target_cells])
+    claim_ranks = np.concatenate([ranks, ranks])
+    order = np.lexsort((claim_ranks, cells))
+    cells, claim_ranks = cells[order], claim_ranks[order]
+    first = np.concatenate([[True], cells[1:] != cells[:-1]])
+    claimed_cells, claimed_by = cells[first], claim_ranks[first]
+    own_winners = claimed_by[np.searchsorted(claimed_cells, own_cells)]
+    target_winners = claimed_by[np.searchsorted(claimed_cells, target_cells)]
+    return (own_winners == ranks) & (target_winners == ranks)
+
+
+def _apply_actions(world, slots, actions, target_rows, target_columns):
+    """
+    Apply non conflicting actions. Returns which organisms acted and the reward of each
+    """
+    rewards = np.zeros(len(slots), dtype=np.int64)
+    moving = actions < 4
+    eating = (actions >= 4) & (actions < 8)
+    mating = actions >= 8
+    # Only as many organisms can mate as there are free cells for babies
+    mating[np.flatnonzero(mating)[world.free_count:]] = False
+    acted = moving | eating | mating
+
+    # Eat whatever is in the target cell
+    if PROFILER.enabled:
+        PROFILER.count("deaths", int(np.count_nonzero(world.cell_types(target_rows[eating], target_columns[eating]) == ORGANISM)))
+    world.energy[slots[eating]] = np.minimum(world.energy[slots[eating]] + constants.ENERGY_FROM_EATING, constants.MAX_ENERGY)
+    world.clear_cells(target_rows[eating], target_columns[eating])
+    rewards[eating] = REWARD_FROM_EATING
+
+    # Moving and mating cost energy and kill the organism if it runs out
+    world.energy[slots[moving]] += ENERGY_FROM_MOVING
+    world.energy[slots[mating]] += ENERGY_FROM_MATING
+    rewards[moving] = REWARD_FROM_MOVING
+    rewards[mating] = REWARD_FROM_MATING
+    dying = (moving | mating) & (world.energy[slots] <= 0)
+    world.kill_organisms(slots[dying])
+    PROFILER.count("deaths", int(np.count_nonzero(dying)))
+    rewards[dying] = REWARD_FROM_DYING
+
+    moving &= ~dying
+    world.move_organisms(slots[moving], target_rows[moving], target_columns[moving])
+
+    # Babies go to random empty cells once everything else has moved
+    mating &= ~dying
+    _add_babies(world, slots[mating], world.occupants(target_rows[mating], target_columns[mating]))
+    return acted, rewards
+
+
+def _add_babies(world, parents, partners):
+    baby_rows, baby_columns = world.random_empty_cells(len(parents))
+    for parent, partner, row, column in zip(parents.tolist(), partners.tolist(), baby_rows.tolist(), baby_columns.tolist()):
+        dad = world.organisms[parent]
+        genome = dad._combine_genomes(world.organisms[partner], dad)
+        world[row][column] = Organism(row, column, genome=genome, memories=dad.past_memories)
+    Organism.births += len(parents)
+    PROFILER.count("births", len(parents))
+
+
+def _remember(world, slots, visible_tiles, actions, rewards, new_visible_tiles):
+    for index, slot in enumerate(slots.tolist()):
+        reward = int(rewards[index])
+        world.organisms[slot].remember(visible_tiles[index:index + 1].copy(), int(actions[index]), reward,
+                                       new_visible_tiles[index:index + 1].copy(), reward == REWARD_FROM_DYING)
@@ -0,0 +1,342 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Benchmarks never open a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+
+import game
+import organism
+import policies
+from genome import Genome
+from organism import Organism
+from history import HistoryWriter, ReplayReader
+from experience_store import write_experience, read_experience
+from pretrain_store import PretrainStore
+
+BENCHMARK_LOCATION = "data/benchmark.json"
+SEED = 1234
+# Relative slowdown against the baseline before a result counts as a regression
+REGRESSION_THRESHOLD = 0.1
+# Each benchmark is repeated and the best run kept, which is the least noisy on shared boxes
+REPEATS = 3
+# Grid sizes and organism spawn rates of the step benchmarks, by engine
+STEP_CASES = {
+    "grid": [(20, 0.05), (50, 0.02)],
+    "array": [(20, 0.05), (50, 0.02), (200, 0.02)],
+}
+STEPS = 20
+RECORDS_PER_ORGANISM = 64
+
+
+def best_rate(run, amount):
+    """
+    amount divided by the fastest of REPEATS runs of run. run does its own setup and
+    returns the seconds taken by the part being measured
+    """
+    return amount / min(run() for _ in range(REPEATS))
+
+
+def with_policy(name, run):
+    """
+    run() with new organisms getting their models from the named policy, which is
+    switched back to the one before afterwards
+    """
+    previous = policies.POLICY
+    policies.use_policy(name)
+    try:
+        return run()
+    finally:
+        policies.POLICY = previous
+
+
+def new_game(grid_size, organism_rate, engine, food_rate=0.2):
+    game.seed_random(SEED)
+    game_grid = game.create_game_grid(grid_size, engine)
+    game_grid = game.randomly_add_food(game_grid, food_rate)
+    return game.randomly_add_organisms(game_grid, organism_rate)
+
+
+def random_step_rate(grid_size, organism_rate, engine):
+    def run():
+        game_grid = new_game(grid_size, organism_rate, engine)
+        start = time.perf_counter()
+        for step in range(STEPS):
+            game_grid = game.organism_random_action_step(game_grid)
+        return time.perf_counter() - start
+    # Random games have no models, so their babies shouldn't build networks either
+    return with_policy("random", lambda: best_rate(run, STEPS))
+
+
+def predict_step_rate(grid_size, organism_rate, engine):
+    def run():
+        game_grid = new_game(grid_size, organism_rate, engine)
+        # Never explore, so every organism predicts
+        for obj in game.find_organisms(game_grid):
+            obj.epsilon = 0
+        start = time.perf_counter()
+        for step in range(STEPS):
+            game_grid = game.organism_predict_action_step(game_grid)
+        return time.perf_counter() - start
+    return with_policy("keras", lambda: best_rate(run, STEPS))
+
+
+def visible_tiles_rate(engine, calls=2000):
+    def run():
+        game_grid = new_game(50, 0.02, engine)
+        organisms = game.find_organisms(game_grid)
+        start = time.perf_counter()
+        for call in range(calls):
+            organisms[call % len(organisms)]._get_visible_tiles(game_grid)
+        return time.perf_counter() - start
+    return best_rate(run, calls)
+
+
+def synthetic_experience(organism_count, records=RECORDS_PER_ORGANISM):
+    """
+    Records in the {'id': [[id, visible tiles, action, reward, next visible tiles, done]]}
+    form the data writers take
+    """
+    np.random.seed(SEED)
+    data = {}
+    for index in range(organism_count):
+        organism_id = "organism-" + str(index).zfill(27)
+        tiles = np.random.randint(-1, 3, (records, 2, 24)).tolist()
+        actions = np.random.randint(0, 13, records).tolist()
+        rewards = np.random.choice([-1, 50, 100, -1000], records).tolist()
+        data[organism_id] = [[organism_id] + tiles[record][0] + [actions[record], rewards[record]] +
+                             tiles[record][1] + [rewards[record] == -1000] for record in range(records)]
+    return data
+
+
+def synthetic_memories(organism_count, records=RECORDS_PER_ORGANISM):
+    """
+    Synthetic experience in the {'id': records} form read_from_csv returns
+    """
+    return {organism_id: [game.convert_csv_record([str(value) for value in row]) for row in rows]
+            for organism_id, rows in synthetic_experience(organism_count, records).items()}
+
+
+def construction_rate(directory, memories, count=20, warm=False):
+    """
+    Organisms built per second. Every run starts with an empty pretrain store in directory,
+    which with warm is filled with the same organisms before they are timed
+    """
+    def genomes():
+        # Drawn up front, as training from memories draws random numbers a stored run doesn't
+        game.seed_random(SEED)
+        return [Genome() for index in range(count)]
+
+    def run():
+        organism.PRETRAIN_STORE = PretrainStore(tempfile.mkdtemp(dir=directory))
+        if warm:
+            for genome in genomes():
+                Organism(0, 0, genome=genome, memories=memories)
+        timed = genomes()
+        start = time.perf_counter()
+        for genome in timed:
+            Organism(0, 0, genome=genome, memories=memories)
+        return time.perf_counter() - start
+
+    previous = organism.PRETRAIN_STORE
+    try:
+        return with_policy("keras", lambda: best_rate(run, count))
+    finally:
+        organism.PRETRAIN_STORE = previous
+
+
+def replay_rate(calls=20):
+    def run():
+        game.seed_random(SEED)
+        obj = Organism(0, 0)
+        for records in synthetic_memories(1, organism.BATCH_SIZE * 4).values():
+            for record in records:
+                obj.remember(*record)
+        start = time.perf_counter()
+        for call in range(calls):
+            obj.replay()
+        return time.perf_counter() - start
+    return with_policy("keras", lambda: best_rate(run, calls * organism.BATCH_SIZE))
+
+
+def file_size(location):
+    if os.path.isdir(location):
+        return sum(file_size(os.path.join(location, name)) for name in os.listdir(location))
+    return os.path.getsize(location)
+
+
+def csv_rates(directory, organism_count=200):
+    data = synthetic_experience(organism_count)
+    location = os.path.join(directory, "life.csv")
+    filename = game.add_file_information_to_name(location, 0.2, 0.002, 100)
+
+    def write():
+        for name in (filename, game.index_file_name(filename)):
+            if os.path.exists(name):
+                os.remove(name)
+        start = time.perf_counter()
+        game.write_to_csv(data, location, 0.2, 0.002, 100)
+        return time.perf_counter() - start
+
+    def read():
+        start = time.perf_counter()
+        game.read_from_csv(location, 0.2, 0.002, 100, organism_count)
+        return time.perf_counter() - start
+
+    write_rate = best_rate(write, 1)
+    megabytes = file_size(filename) / 1e6
+    return write_rate * megabytes, best_rate(read, megabytes)
+
+
+def npy_rates(directory, organism_count=200):
+    data = synthetic_experience(organism_count)
+    location = os.path.join(directory, "experience")
+
+    def write():
+        shutil.rmtree(location, ignore_errors=True)
+        os.makedirs(location)
+        start = time.perf_counter()
+        write_experience(data, location)
+        return time.perf_counter() - start
+
+    def read():
+        start = time.perf_counter()
+        memories = read_experience(location, organism_count, 1)
+        # Records are memory mapped, so touch them all
+        for records in memories.values():
+            records.batch(np.arange(len(records)))
+        return time.perf_counter() - start
+
+    write_rate = best_rate(write, 1)
+    megabytes = file_size(location) / 1e6
+    return write_rate * megabytes, best_rate(read, megabytes)
+
+
+def conversion_rate(engine, calls=20):
+    def run():
+        game_grid = new_game(200, 0.02, engine)
+        start = time.perf_counter()
+        for call in range(calls):
+            game.convert_game_state(game_grid)
+        return time.perf_counter() - start
+    return best_rate(run, calls)
+
+
+def history_rates(directory, grid_size=200, frames=200):
+    location = os.path.join(directory, "history.bin")
+    game_grid = new_game(grid_size, 0.02, "array")
+    states = []
+    for frame in range(frames):
+        game_grid = game.organism_random_action_step(game_grid)
+        states.append(game.convert_game_state(game_grid).copy())
+
+    def write():
+        start = time.perf_counter()
+        writer = HistoryWriter(location, (grid_size, grid_size))
+        for cells in states:
+            writer.write(cells)
+        writer.close()
+        return time.perf_counter() - start
+
+    def load():
+        start = time.perf_counter()
+        reader = ReplayReader(location)
+        previous = None
+        for index in range(len(reader)):
+            previous = (index, reader.frame(index, previous))
+        reader.close()
+        return time.perf_counter() - start
+
+    return best_rate(write, frames), best_rate(load, frames)
+
+
+def run_benchmarks(directory):
+    """
+    Every benchmark as name to {"value", "unit"}. Higher values are always better
+    """
+    results = {}
+
+    def record(name, value, unit):
+        results[name] = {"value": value, "unit": unit}
+        print(name.ljust(48) + str(round(value, 2)).rjust(14) + " " + unit)
+
+    for engine, cases in STEP_CASES.items():
+        for grid_size, organism_rate in cases:
+            suffix = engine + "_" + str(grid_size) + "_" + str(organism_rate)
+            record("random_step_" + suffix, random_step_rate(grid_size, organism_rate, engine), "steps/s")
+            record("predict_step_" + suffix, predict_step_rate(grid_size, organism_rate, engine), "steps/s")
+        record("visible_tiles_" + engine, visible_tiles_rate(engine), "calls/s")
+        record("convert_game_state_" + engine, conversion_rate(engine), "calls/s")
+
+    record("organism_construction", construction_rate(directory, None), "organisms/s")
+    memories = synthetic_memories(2)
+    record("organism_construction_with_memories", construction_rate(directory, memories), "organisms/s")
+    record("organism_construction_with_stored_memories", construction_rate(directory, memories, warm=True), "organisms/s")
+    record("replay", replay_rate(), "samples/s")
+
+    write_rate, read_rate = csv_rates(directory)
+    record("write_to_csv", write_rate, "MB/s")
+    record("read_from_csv", read_rate, "MB/s")
+    write_rate, read_rate = npy_rates(directory)
+    record("write_experience", write_rate, "MB/s")
+    record("read_experience", read_rate, "MB/s")
+    write_rate, load_rate = history_rates(directory)
+    record("history_write", write_rate, "frames/s")
+    record("history_replay", load_rate, "frames/s")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Names of the benchmarks that got slower than the baseline by more than threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        previous = baseline[name]["value"]
+        change = result["value"] / previous - 1
+        print(name.ljust(48) + (str(round(100 * change, 1)) + " %").rjust(10))
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(output_location, baseline_location=None, threshold=REGRESSION_THRESHOLD):
+    directory = tempfile.mkdtemp()
+    try:
+        results = run_benchmarks(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output_directory = os.path.dirname(output_location)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    with open(output_location, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print("Wrote results to " + output_location)
+
+    if baseline_location:
+        with open(baseline_location) as file:
+            baseline = json.load(file)
+        print("Change against " + baseline_location)
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print("Regressions beyond " + str(round(100 * threshold)) + " %: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="Where to write the results as json", default=BENCHMARK_LOCATION)
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against", default=None)
+    parser.add_argument("--threshold", help="Slowdown against the baseline that counts as a regression, 0.1 is 10%%", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+    sys.exit(main(args.output, args.baseline, args.threshold))
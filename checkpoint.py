@@ -0,0 +1,86 @@
+import gzip
+import os
+import pickle
+import random
+
+import numpy as np
+
+from organism import Organism
+
+CHECKPOINT_LOCATION = "data/checkpoint.pkl.gz"
+CHECKPOINT_VERSION = 2
+
+
+def organism_state(organism):
+    """
+    Everything an organism needs to carry on where it was, apart from the past memories it
+    was trained from, which are shared by every organism and read again on resume
+    """
+    return {
+        "id": organism.id,
+        "row": organism.row,
+        "column": organism.column,
+        "energy": organism.energy,
+        "genome": organism.genome,
+        "epsilon": organism.epsilon,
+        "memory": list(organism.memory),
+        # Organisms of policies without models have no weights
+        "weights": [np.array(weight) for weight in organism.model.get_weights()] if organism.model is not None else [],
+        "optimizer_state": organism.model.get_optimizer_state() if organism.model is not None else [],
+        "past_memories": organism.past_memories is not None,
+    }
+
+
+def restore_organism(state, memories=None):
+    organism = Organism(state["row"], state["column"], genome=state["genome"])
+    organism.id = state["id"]
+    organism.genome.organism_id = state["id"]
+    organism.energy = state["energy"]
+    organism.epsilon = state["epsilon"]
+    organism.memory.extend(state["memory"])
+    if organism.model is not None and state["weights"]:
+        organism.model.set_weights(state["weights"])
+        organism.model.set_optimizer_state(state["optimizer_state"])
+    if state["past_memories"]:
+        organism.past_memories = memories
+    return organism
+
+
+def save_checkpoint(filename, cells, organisms, state):
+    """
+    Write the cell types, the living organisms, the random number generator states and the
+    game loop's own state to a gzipped pickle. The file is replaced in one go, so a run that
+    is stopped while saving still has its previous checkpoint
+    """
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "cells": np.asarray(cells, dtype=np.int8),
+        "organisms": [organism_state(organism) for organism in organisms],
+        "random_state": random.getstate(),
+        "numpy_random_state": np.random.get_state(),
+        "state": state,
+    }
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_filename = filename + "." + str(os.getpid()) + ".tmp"
+    with gzip.open(temporary_filename, "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_filename, filename)
+
+
+def load_checkpoint(filename, memories=None):
+    """
+    The cell types, organisms and game loop state of a checkpoint. The random number
+    generators are put back to where they were when it was saved
+    """
+    with gzip.open(filename, "rb") as file:
+        checkpoint = pickle.load(file)
+    if checkpoint["version"] != CHECKPOINT_VERSION:
+        raise Exception(filename + " is a checkpoint of an unsupported version")
+
+    organisms = [restore_organism(state, memories) for state in checkpoint["organisms"]]
+    # Creating the organisms draws initial weights, so the states are restored after
+    random.setstate(checkpoint["random_state"])
+    np.random.set_state(checkpoint["numpy_random_state"])
+    return checkpoint["cells"], organisms, checkpoint["state"]
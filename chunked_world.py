@@ -0,0 +1,189 @@
+import numpy as np
+
+from food import Food
+from vision import VISION_CODES, VISION_OFFSETS, OUT_OF_BOUNDS
+from world import World, WorldRow, EMPTY, FOOD, ORGANISM
+
+# Cells along each side of a chunk
+CHUNK_SIZE = 64
+# Candidates drawn per empty cell still needed when sampling empty cells
+OVERSAMPLING = 2
+
+
+class ChunkedVision:
+    """
+    Visible tiles gathered from the chunks of a ChunkedWorld, in place of the padded copy
+    of the whole world that Vision keeps
+    """
+    def __init__(self, world):
+        self.world = world
+        self.version = 0
+
+    def update(self, rows, columns, cell_types):
+        self.version += 1
+
+    def observe(self, rows, columns):
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        types = self.world.cell_types(rows[:, None] + VISION_OFFSETS[:, 0], columns[:, None] + VISION_OFFSETS[:, 1])
+        return np.where(types == OUT_OF_BOUNDS, OUT_OF_BOUNDS, VISION_CODES[types]).astype(int)
+
+
+class ChunkedWorld(World):
+    """
+    World for very large, mostly empty grids. Cells are kept in CHUNK_SIZE square tiles
+    that are only allocated once something is placed in them and dropped again when they
+    are empty, and organism slots in tiles of their own that only exist where organisms
+    are. Empty cells are found by sampling instead of an index of every free cell. Memory
+    and the cost of a step follow the occupied area rather than the size of the grid.
+
+    Organism state lives in the same per-slot arrays as in World, so everything that works
+    on slots works unchanged. Reads and writes of many cells are sorted by chunk and done a
+    chunk at a time.
+    """
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        self.chunks_per_side = (grid_size + CHUNK_SIZE - 1) // CHUNK_SIZE
+        # Chunk key to tile of cell types, and to tile of organism slots
+        self.tiles = {}
+        self.occupant_tiles = {}
+        # Non empty cells and organisms in each chunk
+        self.chunk_cells = np.zeros(self.chunks_per_side * self.chunks_per_side, dtype=np.int64)
+        self.chunk_organisms = np.zeros(self.chunks_per_side * self.chunks_per_side, dtype=np.int64)
+        self.vision = ChunkedVision(self)
+        self._init_slots()
+        self._rows = [WorldRow(self, row) for row in range(grid_size)]
+
+    @property
+    def free_count(self):
+        return self.grid_size * self.grid_size - self.organism_count - self.food_count
+
+    @property
+    def cells(self):
+        """
+        Dense copy of the cell types of the whole grid
+        """
+        cells = np.zeros((self.grid_size, self.grid_size), dtype=np.int8)
+        for key, tile in self.tiles.items():
+            row, column = divmod(key, self.chunks_per_side)
+            row, column = row * CHUNK_SIZE, column * CHUNK_SIZE
+            cells[row:row + CHUNK_SIZE, column:column + CHUNK_SIZE] = \
+                tile[:self.grid_size - row, :self.grid_size - column]
+        return cells
+
+    def _chunk_keys(self, rows, columns):
+        return (rows // CHUNK_SIZE) * self.chunks_per_side + columns // CHUNK_SIZE
+
+    def _by_chunk(self, rows, columns):
+        """
+        Yield (chunk key, positions of the cells in that chunk) for the given cells
+        """
+        keys = self._chunk_keys(rows, columns)
+        order = np.argsort(keys, kind="stable")
+        chunk_keys, starts = np.unique(keys[order], return_index=True)
+        stops = np.append(starts[1:], len(order))
+        for key, start, stop in zip(chunk_keys.tolist(), starts.tolist(), stops.tolist()):
+            yield key, order[start:stop]
+
+    def _gather(self, tiles, rows, columns, default, dtype):
+        values = np.full(len(rows), default, dtype=dtype)
+        for key, positions in self._by_chunk(rows, columns):
+            tile = tiles.get(key)
+            if tile is not None:
+                values[positions] = tile[rows[positions] % CHUNK_SIZE, columns[positions] % CHUNK_SIZE]
+        return values
+
+    def _scatter(self, tiles, rows, columns, values, default, dtype, allocate=True):
+        values = np.broadcast_to(values, rows.shape)
+        for key, positions in self._by_chunk(rows, columns):
+            tile = tiles.get(key)
+            if tile is None:
+                if not allocate:
+                    continue
+                tile = tiles[key] = np.full((CHUNK_SIZE, CHUNK_SIZE), default, dtype=dtype)
+            tile[rows[positions] % CHUNK_SIZE, columns[positions] % CHUNK_SIZE] = values[positions]
+
+    def get(self, row, column):
+        key = (row // CHUNK_SIZE) * self.chunks_per_side + column // CHUNK_SIZE
+        tile = self.tiles.get(key)
+        cell = EMPTY if tile is None else tile[row % CHUNK_SIZE, column % CHUNK_SIZE]
+        if cell == ORGANISM:
+            return self.organisms[self.occupant_tiles[key][row % CHUNK_SIZE, column % CHUNK_SIZE]]
+        elif cell == FOOD:
+            return Food(row, column)
+        return None
+
+    def _write(self, rows, columns, cell_type, slots=-1):
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        columns = np.asarray(columns, dtype=np.int64).ravel()
+        previous = self._gather(self.tiles, rows, columns, EMPTY, np.int8)
+        was_organism = previous == ORGANISM
+        previous_slots = self._gather(self.occupant_tiles, rows[was_organism], columns[was_organism], -1, np.int32)
+        self.on_grid[previous_slots] = False
+        self.organism_count -= len(previous_slots)
+        self.food_count -= int(np.count_nonzero(previous == FOOD))
+
+        keys = self._chunk_keys(rows, columns)
+        np.add.at(self.chunk_cells, keys, int(cell_type != EMPTY) - (previous != EMPTY))
+        np.add.at(self.chunk_organisms, keys, int(cell_type == ORGANISM) - was_organism)
+
+        self._scatter(self.tiles, rows, columns, cell_type, EMPTY, np.int8)
+        if cell_type == ORGANISM:
+            self._scatter(self.occupant_tiles, rows, columns, slots, -1, np.int32)
+            self.on_grid[slots] = True
+            self.row[slots] = rows
+            self.column[slots] = columns
+            self.organism_count += len(rows)
+        else:
+            self._scatter(self.occupant_tiles, rows, columns, -1, -1, np.int32, allocate=False)
+            if cell_type == FOOD:
+                self.food_count += len(rows)
+
+        # Drop the tiles of chunks that were emptied
+        for key in np.unique(keys).tolist():
+            if self.chunk_organisms[key] == 0:
+                self.occupant_tiles.pop(key, None)
+            if self.chunk_cells[key] == 0:
+                self.tiles.pop(key, None)
+        self.vision.update(rows, columns, cell_type)
+
+    def occupants(self, rows, columns):
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        return self._gather(self.occupant_tiles, rows.ravel(), columns.ravel(), -1, np.int32).reshape(rows.shape)
+
+    def cell_types(self, rows, columns):
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        inside = (rows >= 0) & (rows < self.grid_size) & (columns >= 0) & (columns < self.grid_size)
+        types = np.full(rows.shape, OUT_OF_BOUNDS, dtype=np.int8)
+        types[inside] = self._gather(self.tiles, rows[inside], columns[inside], EMPTY, np.int8)
+        return types
+
+    def add_food(self, mask):
+        rows, columns = np.nonzero(mask)
+        empty = self.cell_types(rows, columns) == EMPTY
+        self._write(rows[empty], columns[empty], FOOD)
+
+    def random_empty_cells(self, count):
+        """
+        Up to count distinct empty cells as (rows, columns), found by drawing random cells
+        and keeping the empty ones
+        """
+        count = min(count, self.free_count)
+        cell_count = self.grid_size * self.grid_size
+        chosen = np.zeros(0, dtype=np.int64)
+        while len(chosen) < count:
+            candidates = np.random.randint(0, cell_count, OVERSAMPLING * (count - len(chosen)) + 1).astype(np.int64)
+            empty = self.cell_types(candidates // self.grid_size, candidates % self.grid_size) == EMPTY
+            chosen = np.concatenate([chosen, candidates[empty]])
+            # Drop repeats, keeping the order the cells were drawn in
+            chosen = chosen[np.sort(np.unique(chosen, return_index=True)[1])]
+        chosen = chosen[:count]
+        return chosen // self.grid_size, chosen % self.grid_size
+
+    def random_free_cell(self):
+        if self.free_count == 0:
+            return None
+        rows, columns = self.random_empty_cells(1)
+        return int(rows[0]), int(columns[0])
@@ -0,0 +1,19 @@
+# Organism settings shared by the game, the step functions and the renderers. Kept apart
+# from organism.py so reading them doesn't import a policy framework
+ORGANISM_COLOR = (0, 0, 255)
+ORGANISM_WIDTH = 10
+ORGANISM_HEIGHT = 10
+INITIAL_ENERGY = 100
+# Swept by sweep.py, so read them through the module rather than importing their values
+MAX_ENERGY = 200
+ENERGY_FROM_EATING = 50
+ATTEMPT_LIMIT = 50
+ENERGY_FROM_MOVING = -1
+ENERGY_FROM_MATING = -1
+# Rewards for model
+REWARD_FROM_EATING = 100
+REWARD_FROM_MOVING = -1
+REWARD_FROM_MATING = 50
+REWARD_FROM_DYING = -1000
+BATCH_SIZE = 32
+MUTATE_CHANCE = 0.01
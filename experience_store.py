@@ -0,0 +1,129 @@
+import os
+import random
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+# Column name to dtype and shape of a single record
+COLUMNS = {
+    'organism_id': ('S36', ()),
+    'state': (np.int8, (24,)),
+    'action': (np.int8, ()),
+    'reward': (np.int32, ()),
+    'next_state': (np.int8, (24,)),
+    'done': (bool, ()),
+}
+
+
+class ExperienceSlice(Sequence):
+    """
+    The records of one organism in a chunk, read straight from the memory mapped columns.
+    Items are (state, action, reward, next_state, done) tuples like the ones remember stores
+    """
+    def __init__(self, chunk, start, stop):
+        self.chunk = chunk
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        position = self.start + index
+        return (self.chunk['state'][position:position + 1], int(self.chunk['action'][position]),
+                int(self.chunk['reward'][position]), self.chunk['next_state'][position:position + 1],
+                bool(self.chunk['done'][position]))
+
+    def batch(self, indexes):
+        """
+        Stacked (states, actions, rewards, next_states, dones) for the given record indexes
+        """
+        positions = self.start + np.asarray(indexes)
+        return (self.chunk['state'][positions], self.chunk['action'][positions].astype(int),
+                self.chunk['reward'][positions].astype(float), self.chunk['next_state'][positions],
+                self.chunk['done'][positions])
+
+
+def write_experience(data, directory):
+    """
+    Append the records of one game as a new chunk of .npy column files.
+    Expects the same {'id': [[id, visible tiles, action, reward, next visible tiles, done]]}
+    data as write_to_csv. The chunk is written under a temporary name and renamed when
+    complete so readers never see a partial chunk
+    """
+    records = [row for organism in data for row in data[organism]]
+    if not records:
+        return
+
+    columns = {
+        'organism_id': [row[0] for row in records],
+        'state': [row[1:25] for row in records],
+        'action': [row[25] for row in records],
+        'reward': [row[26] for row in records],
+        'next_state': [row[27:51] for row in records],
+        'done': [row[51] for row in records],
+    }
+    chunk_name = str(time.time_ns()) + "_" + str(os.getpid())
+    temporary_location = os.path.join(directory, chunk_name + ".part")
+    os.makedirs(temporary_location)
+    for name, (dtype, shape) in COLUMNS.items():
+        np.save(os.path.join(temporary_location, name + ".npy"), np.array(columns[name], dtype=dtype))
+    os.rename(temporary_location, os.path.join(directory, chunk_name))
+
+
+def load_chunks(directory):
+    """
+    Every complete chunk in the directory, oldest first, as dicts of memory mapped columns
+    """
+    if not os.path.isdir(directory):
+        return []
+    chunks = []
+    for chunk_name in sorted(os.listdir(directory)):
+        if chunk_name.endswith(".part"):
+            continue
+        location = os.path.join(directory, chunk_name)
+        chunks.append({name: np.load(os.path.join(location, name + ".npy"), mmap_mode='r') for name in COLUMNS})
+    return chunks
+
+
+def choose_ids(candidates, ids_to_read, selection="first"):
+    """
+    Pick up to ids_to_read of the (organism id, record count, total reward, location)
+    candidates. first keeps the order they were written in, random samples them and best
+    takes the ones with the highest mean reward
+    """
+    if selection == "random":
+        return random.sample(candidates, min(ids_to_read, len(candidates)))
+    elif selection == "best":
+        candidates = sorted(candidates, key=lambda candidate: candidate[2] / candidate[1], reverse=True)
+    return candidates[:ids_to_read]
+
+
+def read_experience(directory, ids_to_read, min_records, selection="first"):
+    """
+    Memories of ids_to_read organisms with at least min_records records, chosen with
+    choose_ids, in the same {'id': records} form as read_from_csv returns. Records are not
+    copied out of the files
+    """
+    print("Reading in past memories from log for " + str(ids_to_read) + " ids")
+    candidates = []
+    for chunk in load_chunks(directory):
+        ids = chunk['organism_id']
+        if len(ids) == 0:
+            continue
+        starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+        stops = np.append(starts[1:], len(ids))
+        rewards = np.add.reduceat(chunk['reward'].astype(np.int64), starts)
+        for start, stop, reward in zip(starts.tolist(), stops.tolist(), rewards.tolist()):
+            if stop - start >= min_records:
+                candidates.append((ids[start].decode("UTF-8"), stop - start, reward, (chunk, start, stop)))
+
+    memories = {}
+    for organism_id, count, reward, location in choose_ids(candidates, ids_to_read, selection):
+        memories[organism_id] = ExperienceSlice(*location)
+    return memories
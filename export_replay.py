@@ -0,0 +1,72 @@
+import argparse
+import os
+import multiprocessing
+
+# Nothing is shown on screen, so pygame doesn't need a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from history import ReplayReader
+from renderer import CELL_COLORS, CELL_WIDTH
+
+# Frames handed to a worker at a time. Each task decodes its frames forward from the
+# closest keyframe, so bigger tasks decode less twice but balance worse across workers
+FRAMES_PER_TASK = 200
+FRAME_NAME = "frame_{:06d}.png"
+
+
+def rasterize(cells, scale):
+    """
+    The (rows * scale, columns * scale, 3) pixels of an array of cell types, indexed (x, y)
+    like the pygame surfaces
+    """
+    pixels = CELL_COLORS[cells]
+    return np.repeat(np.repeat(pixels, scale, axis=0), scale, axis=1)
+
+
+def export_frames(input_file, output_directory, indexes, scale):
+    """
+    Write the frames at indexes of a history file as png images. Returns how many were written
+    """
+    reader = ReplayReader(input_file)
+    previous = None
+    for index in indexes:
+        cells = reader.frame(index, previous)
+        previous = (index, cells)
+        surface = pygame.surfarray.make_surface(rasterize(cells, scale))
+        pygame.image.save(surface, os.path.join(output_directory, FRAME_NAME.format(index)))
+    reader.close()
+    return len(indexes)
+
+
+def main(input_file, output_directory, stride=1, scale=CELL_WIDTH, start=0, end=None, workers=None):
+    reader = ReplayReader(input_file)
+    frame_count = len(reader)
+    reader.close()
+    if end is None or end > frame_count:
+        end = frame_count
+
+    os.makedirs(output_directory, exist_ok=True)
+    indexes = list(range(start, end, stride))
+    tasks = [(input_file, output_directory, indexes[position:position + FRAMES_PER_TASK], scale)
+             for position in range(0, len(indexes), FRAMES_PER_TASK)]
+
+    print("Exporting " + str(len(indexes)) + " frames to " + output_directory)
+    with multiprocessing.Pool(workers) as pool:
+        written = sum(pool.starmap(export_frames, tasks))
+    print("Wrote " + str(written) + " frames")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input-file", help="History log file to export", required=True)
+    parser.add_argument("-o", "--output-directory", help="Directory to write the png frames to", default="data/frames")
+    parser.add_argument("--stride", help="Only export every nth frame", type=int, default=1)
+    parser.add_argument("--scale", help="Pixels per cell", type=int, default=CELL_WIDTH)
+    parser.add_argument("--start", help="First frame to export", type=int, default=0)
+    parser.add_argument("--end", help="Frame to stop exporting at", type=int, default=None)
+    parser.add_argument("--workers", help="Number of processes encoding frames. Defaults to one per cpu", type=int, default=None)
+    args = parser.parse_args()
+    main(args.input_file, args.output_directory, args.stride, args.scale, args.start, args.end, args.workers)
@@ -0,0 +1,103 @@
+import numpy as np
+
+from food import Food
+from world import World
+
+FOOD_PATTERNS = ["uniform", "patches"]
+# Cells per fertile patch and the radius of a patch for the patches pattern
+PATCH_AREA = 400
+PATCH_RADIUS = 5
+# Patches further away than this add about 1% to a cell's fertility and are left out
+PATCH_REACH = 3 * PATCH_RADIUS
+
+
+def fertility_map(grid_size, pattern):
+    """
+    How likely food is to grow back in each cell relative to the most fertile one, or None
+    when every cell is equally fertile. Indexed like an array with [rows, columns]
+    """
+    if pattern == "uniform":
+        return None
+
+    patch_count = max(1, grid_size * grid_size // PATCH_AREA)
+    return PatchFertility(grid_size, np.random.randint(0, grid_size, (patch_count, 2)))
+
+
+class PatchFertility:
+    """
+    Fertility of patches around the given centres, worked out only for the cells asked
+    for. Centres are sorted into square buckets PATCH_REACH wide, so a cell only looks at
+    the centres in its own and the eight surrounding buckets and nothing the size of the
+    grid is ever built.
+    """
+    def __init__(self, grid_size, centres):
+        self.buckets_per_side = grid_size // PATCH_REACH + 1
+        keys = self._bucket_keys(centres[:, 0] // PATCH_REACH, centres[:, 1] // PATCH_REACH)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.centres = centres[order]
+
+    def _bucket_keys(self, bucket_rows, bucket_columns):
+        return bucket_rows.astype(np.int64) * self.buckets_per_side + bucket_columns
+
+    def __getitem__(self, cells):
+        rows, columns = (np.asarray(index, dtype=np.int64) for index in cells)
+        fertility = np.zeros(len(rows))
+        for row_change in (-1, 0, 1):
+            for column_change in (-1, 0, 1):
+                bucket_rows = rows // PATCH_REACH + row_change
+                bucket_columns = columns // PATCH_REACH + column_change
+                inside = (bucket_rows >= 0) & (bucket_rows < self.buckets_per_side) & \
+                         (bucket_columns >= 0) & (bucket_columns < self.buckets_per_side)
+                keys = self._bucket_keys(bucket_rows, bucket_columns)
+                starts = np.searchsorted(self.keys, keys, side="left")
+                counts = np.where(inside, np.searchsorted(self.keys, keys, side="right") - starts, 0)
+                # One pair for every cell and centre in the bucket next to it
+                cells_of_pairs = np.repeat(np.arange(len(rows)), counts)
+                centres_of_pairs = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                distance = (rows[cells_of_pairs] - self.centres[centres_of_pairs, 0]) ** 2 + \
+                           (columns[cells_of_pairs] - self.centres[centres_of_pairs, 1]) ** 2
+                np.maximum.at(fertility, cells_of_pairs, np.exp(-distance / (2 * PATCH_RADIUS ** 2)))
+        return fertility
+
+
+class FoodGrowth:
+    """
+    Grows food back in empty cells every step. Each empty cell grows food with probability
+    rate times its fertility. Rather than rolling for every cell, the number of cells is
+    drawn from a binomial and only that many are picked, so a step costs about as much as
+    the food it grows.
+    """
+    def __init__(self, grid_size, rate, pattern="uniform", fertility=None):
+        self.grid_size = grid_size
+        self.rate = rate
+        self.fertility = fertility if fertility is not None else fertility_map(grid_size, pattern)
+
+    def grow(self, game_grid):
+        if isinstance(game_grid, World):
+            # Candidates are drawn from the index of empty cells
+            count = np.random.binomial(game_grid.free_count, self.rate)
+            if count == 0:
+                return game_grid
+            rows, columns = game_grid.random_empty_cells(count)
+        else:
+            # Without an index, candidates are drawn from every cell and only the empty ones kept
+            count = np.random.binomial(self.grid_size * self.grid_size, self.rate)
+            if count == 0:
+                return game_grid
+            flat = np.unique(np.random.randint(0, self.grid_size * self.grid_size, count))
+            rows, columns = flat // self.grid_size, flat % self.grid_size
+
+        if self.fertility is not None:
+            # Thin the candidates down to each cell's fertility
+            kept = np.random.random(len(rows)) < self.fertility[rows, columns]
+            rows, columns = rows[kept], columns[kept]
+
+        if isinstance(game_grid, World):
+            game_grid.place_food(rows, columns)
+            return game_grid
+
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            if game_grid[row][column] is None:
+                game_grid[row][column] = Food(row, column)
+        return game_grid
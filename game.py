@@ -1,137 +1,360 @@
 import pygame
 import random
 import csv
+import io
+import os
 import argparse
+import multiprocessing
 import numpy as np
 
 from food import Food
-from organism import Organism, BATCH_SIZE
+from constants import BATCH_SIZE
+from organism import Organism
+from world import World, FOOD, ORGANISM
+from chunked_world import ChunkedWorld
+from batch_step import random_step
+from inference import predict_grouped
+from experience_store import write_experience, read_experience, choose_ids
+from history import HistoryWriter
+from renderer import Renderer
+from food_growth import FoodGrowth, FOOD_PATTERNS
+from profiler import PROFILER
+from checkpoint import save_checkpoint, load_checkpoint, CHECKPOINT_LOCATION
+from policies import POLICIES, use_policy
 
-SCREEN_BACKGROUND = 0, 0, 0
 MAX_STEPS = 1000
+HISTORY_LOCATION = "data/history_log.bin"
+PROFILE_LOCATION = "data/profile.csv"
 
 
-def main(grid_size, initial_food_rate, initial_organism_rate, data_output_location, gui, games, random, store_data, memory_read, max_ids_to_read, store_history):
+def main(grid_size, initial_food_rate, initial_organism_rate, data_output_location, gui, games, random, store_data, memory_read, max_ids_to_read, store_history, engine="grid", data_format="csv", memory_selection="first", history_location=HISTORY_LOCATION, history_compression=True, workers=1, seed=None, checkpoint_every=0, checkpoint_location=CHECKPOINT_LOCATION, resume=None, food_regrowth_rate=0.0, food_pattern="uniform", profile_location=None, policy=None):
     # Read memories for training
-    if memory_read:
-        memories = read_from_csv(data_output_location, initial_food_rate, initial_organism_rate, grid_size, max_ids_to_read)
+    if memory_read and data_format == "npy":
+        directory = experience_directory(data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+        memories = read_experience(directory, max_ids_to_read, BATCH_SIZE, memory_selection)
+    elif memory_read:
+        memories = read_from_csv(data_output_location, initial_food_rate, initial_organism_rate, grid_size, max_ids_to_read, memory_selection)
     else:
         memories = None
 
-    for game in range(games):
+    if workers > 1:
+        # Games played in other processes can't share a window
+        gui = False
+    settings = {"grid_size": grid_size, "initial_food_rate": initial_food_rate,
+                "initial_organism_rate": initial_organism_rate, "gui": gui, "random": random,
+                "store_data": store_data, "memory_read": memory_read, "max_ids_to_read": max_ids_to_read,
+                "store_history": store_history, "engine": engine, "history_compression": history_compression,
+                "checkpoint_every": checkpoint_every, "food_regrowth_rate": food_regrowth_rate, "food_pattern": food_pattern,
+                "policy": policy}
+    # Only the first game carries on from the checkpoint being resumed
+    jobs = [(game, seed, dict(settings, history_location=game_file_name(history_location, game, games),
+                              checkpoint_location=game_file_name(checkpoint_location, game, games),
+                              profile_location=profile_location and game_file_name(profile_location, game, games),
+                              resume=resume if game == 0 else None))
+            for game in range(games)]
+
+    summaries = []
+    if workers > 1:
+        # Forking a process that already runs tensorflow can deadlock, so workers start fresh
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=start_worker, initargs=(memories,)) as pool:
+            results = pool.imap_unordered(play_game_in_worker, jobs)
+            # Experience is only ever written from this process, one game at a time
+            for history, summary in results:
+                store_game_data(history, data_format, data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+                summaries.append(summary)
+    else:
+        for game, seed, game_settings in jobs:
+            history, summary = play_game(game, memories, seed, **game_settings)
+            store_game_data(history, data_format, data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+            summaries.append(summary)
+
+    print_summaries(summaries)
+    return summaries
+
+
+def play_game(game, memories, seed, grid_size, initial_food_rate, initial_organism_rate, gui, random, store_data, memory_read, max_ids_to_read, store_history, engine, history_compression, history_location=HISTORY_LOCATION, checkpoint_every=0, checkpoint_location=CHECKPOINT_LOCATION, resume=None, food_regrowth_rate=0.0, food_pattern="uniform", profile_location=None, policy=None):
+    """
+    Play a single game, or carry on with the one saved in the resume checkpoint.
+    The policy is picked by name, or from random when none is given.
+    Returns the recorded experience and a summary of the game
+    """
+    # Organisms get their models from the policy, so it has to be in use before any are created
+    random = not use_policy(policy or ("random" if random else "keras")).predicts
+    if seed is not None:
+        seed_random(seed + game)
+    births = Organism.births
+
+    if resume:
+        game_grid, state = resume_game_grid(resume, engine, memories)
+        grid_size = len(game_grid)
+        history = state["history"]
+        steps = state["steps"]
+        peak_population = state["peak_population"]
+        births -= state["births"]
+        fertility = state.get("fertility")
+        print("Resuming game from step " + str(steps))
+    else:
         history = {}
-        game_states = []
-
-        write_game_states_arguments(grid_size, initial_food_rate, initial_organism_rate, random, memory_read, max_ids_to_read)
-
+        steps = 0
         # Create the game grid
-        game_grid = create_game_grid(grid_size)
+        game_grid = create_game_grid(grid_size, engine)
         # Add food
         game_grid = randomly_add_food(game_grid, initial_food_rate)
         # Add organisms
         game_grid = randomly_add_organisms(game_grid, initial_organism_rate, memories)
-
-        if gui:
-            pygame.init()
-            size = width, height = grid_size * 10, grid_size * 10
-            screen = pygame.display.set_mode(size)
-
-        done = False
-        steps = 0
-
-        if store_history:
-            converted_game_state = convert_game_state(game_grid)
-            game_states.append(converted_game_state)
-
-        while not done and steps <= MAX_STEPS:
-            # Let all organisms do one action
+        peak_population = organisms_left(game_grid)
+        fertility = None
+    food_growth = None
+    if food_regrowth_rate > 0:
+        food_growth = FoodGrowth(grid_size, food_regrowth_rate, food_pattern, fertility)
+    population = organisms_left(game_grid)
+
+    if gui:
+        pygame.init()
+        size = width, height = grid_size * 10, grid_size * 10
+        screen = pygame.display.set_mode(size)
+        renderer = Renderer(screen, (grid_size, grid_size))
+
+    done = False
+
+    if store_history:
+        game_arguments = {"grid_size": grid_size, "initial_food_rate": initial_food_rate,
+                          "initial_organism_rate": initial_organism_rate, "random": random,
+                          "memory_read": memory_read, "max_ids_to_read": max_ids_to_read, "first_step": steps}
+        history_writer = HistoryWriter(history_location, (grid_size, grid_size), game_arguments, compress=history_compression)
+        history_writer.write(convert_game_state(game_grid))
+
+    if profile_location:
+        PROFILER.start(profile_location)
+
+    while not done and steps <= MAX_STEPS:
+        # Let all organisms do one action
+        with PROFILER.phase("actions"):
             if random:
                 game_grid = organism_random_action_step(game_grid)
             else:
                 game_grid = organism_predict_action_step(game_grid)
+        if food_growth:
+            with PROFILER.phase("food_growth"):
+                game_grid = food_growth.grow(game_grid)
 
-            if store_data:
+        if store_data:
+            with PROFILER.phase("store_data"):
                 history = store_organism_data(game_grid, history)
 
-            # Check if all of the organisms are dead
-            if organisms_left(game_grid) == 0:
-                print("All organisms are dead after " + str(steps) + " steps :D")
-                done = True
-            else:
-                steps += 1
-
-            if gui:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        done = True
-                # Draw stuff onto screen
-                screen.fill(SCREEN_BACKGROUND)
-                draw_objects(game_grid, screen)
-                # Update the screen with what has been drawn
-                pygame.display.flip()
-
-            # Append the game states to the log
-            if store_history:
-                converted_game_state = convert_game_state(game_grid)
-                game_states.append(converted_game_state)
-
-        if store_data:
-            write_to_csv(history, data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+        # Check if all of the organisms are dead
+        population = organisms_left(game_grid)
+        peak_population = max(peak_population, population)
+        if population == 0:
+            print("All organisms are dead after " + str(steps) + " steps :D")
+            done = True
+        else:
+            steps += 1
 
+        if gui:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    done = True
+            # Draw stuff onto screen
+            with PROFILER.phase("draw"):
+                renderer.draw(convert_game_state(game_grid))
+
+        # Stream the game state to the log
         if store_history:
-            write_game_states_log(game_states)
+            with PROFILER.phase("history"):
+                history_writer.write(convert_game_state(game_grid))
 
-        if gui:
-            pygame.quit()
+        if checkpoint_every and not done and steps % checkpoint_every == 0:
+            state = {"steps": steps, "history": history, "peak_population": peak_population,
+                     "births": Organism.births - births, "fertility": food_growth.fertility if food_growth else None}
+            with PROFILER.phase("checkpoint"):
+                checkpoint_game_grid(checkpoint_location, game_grid, state)
+
+        PROFILER.end_step(steps)
+
+    PROFILER.stop()
+
+    if store_history:
+        history_writer.close()
+
+    if gui:
+        pygame.quit()
+
+    summary = {"game": game, "steps": steps, "peak_population": peak_population,
+               "final_population": population, "births": Organism.births - births}
+    return history, summary
+
+
+# Memories shared by the games played in a worker process, set once when the worker starts
+worker_memories = None
+
+
+def start_worker(memories):
+    global worker_memories
+    worker_memories = memories
+
+
+def play_game_in_worker(job):
+    game, seed, settings = job
+    return play_game(game, worker_memories, seed, **settings)
+
+
+def seed_random(seed):
+    """
+    Seed both random number generators. None seeds them from the operating system
+    """
+    random.seed(seed)
+    np.random.seed(None if seed is None else seed % 2 ** 32)
+
+
+def game_file_name(location, game, games):
+    # Every game gets its own history log, checkpoint and profile when more than one is played
+    if games == 1:
+        return location
+    name, extension = os.path.splitext(location)
+    return name + "_" + str(game) + extension
+
+
+def checkpoint_game_grid(checkpoint_location, game_grid, state):
+    # ChunkedWorld samples empty cells, the others keep an index of them
+    if isinstance(game_grid, World) and not isinstance(game_grid, ChunkedWorld):
+        # The order of the free cells decides which ones random picks land on
+        state["free_cells"] = game_grid.free_cells[:game_grid.free_count].copy()
+    save_checkpoint(checkpoint_location, convert_game_state(game_grid), find_organisms(game_grid), state)
+
+
+def resume_game_grid(checkpoint_file, engine, memories):
+    """
+    Rebuild the game grid saved in a checkpoint with the given engine, and the game loop state
+    """
+    cells, organisms, state = load_checkpoint(checkpoint_file, memories)
+    game_grid = create_game_grid(len(cells), engine)
+    rows, columns = np.nonzero(cells == FOOD)
+    for row, column in zip(rows.tolist(), columns.tolist()):
+        game_grid[row][column] = Food(row, column)
+    for organism in organisms:
+        game_grid[organism.row][organism.column] = organism
+    if isinstance(game_grid, World) and not isinstance(game_grid, ChunkedWorld) and "free_cells" in state:
+        game_grid.order_free_cells(state["free_cells"])
+    return game_grid, state
+
+
+def store_game_data(history, data_format, data_output_location, initial_food_rate, initial_organism_rate, grid_size):
+    if not history:
+        return
+    if data_format == "npy":
+        directory = experience_directory(data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+        write_experience(history, directory)
+    else:
+        write_to_csv(history, data_output_location, initial_food_rate, initial_organism_rate, grid_size)
+
+
+def print_summaries(summaries):
+    summaries = sorted(summaries, key=lambda summary: summary["game"])
+    for summary in summaries:
+        print("Game " + str(summary["game"]) + ": " + str(summary["steps"]) + " steps, peak population " +
+              str(summary["peak_population"]) + ", final population " + str(summary["final_population"]) +
+              ", " + str(summary["births"]) + " births")
+    if len(summaries) > 1:
+        print("Played " + str(len(summaries)) + " games: mean steps " +
+              str(round(np.mean([summary["steps"] for summary in summaries]), 1)) + ", mean peak population " +
+              str(round(np.mean([summary["peak_population"] for summary in summaries]), 1)) + ", total births " +
+              str(sum(summary["births"] for summary in summaries)))
 
 
 def store_organism_data(game_grid, history):
-    for row in range(len(game_grid)):
-        for column in range(len(game_grid[0])):
-            obj = game_grid[row][column]
-            if type(obj) == Organism and len(obj.memory) > 0:
-                # Get the last memory
-                state, action, reward, next_state, done = obj.memory.pop()
-                obj.remember(state, action, reward, next_state, done)
-
-                # Create the new record
-                visible_tiles = list(state[0])
-                next_visible_tiles = list(next_state[0])
-                new_record = [obj.id]
-                for tile in visible_tiles:
-                    new_record.append(tile)
-                new_record.append(action)
-                new_record.append(reward)
-                for tile in next_visible_tiles:
-                    new_record.append(tile)
-                new_record.append(done)
-
-                # Add new record to history
-                if obj.id not in history:
-                    history[obj.id] = []
-                history[obj.id].append(new_record)
+    for obj in find_organisms(game_grid):
+        if len(obj.memory) > 0:
+            # Get the last memory
+            state, action, reward, next_state, done = obj.memory.pop()
+            obj.remember(state, action, reward, next_state, done)
+
+            # Create the new record
+            visible_tiles = list(state[0])
+            next_visible_tiles = list(next_state[0])
+            new_record = [obj.id]
+            for tile in visible_tiles:
+                new_record.append(tile)
+            new_record.append(action)
+            new_record.append(reward)
+            for tile in next_visible_tiles:
+                new_record.append(tile)
+            new_record.append(done)
+
+            # Add new record to history
+            if obj.id not in history:
+                history[obj.id] = []
+            history[obj.id].append(new_record)
     return history
 
 
-def organism_random_action_step(game_grid):
+def find_organisms(game_grid):
+    if isinstance(game_grid, World):
+        return game_grid.living_organisms()
+
+    organisms = []
     for row in range(len(game_grid)):
         for column in range(len(game_grid[0])):
             obj = game_grid[row][column]
             if type(obj) == Organism:
-                game_grid, _ = obj.random_action(game_grid)
+                organisms.append(obj)
+    return organisms
+
+
+def organism_random_action_step(game_grid):
+    if isinstance(game_grid, World):
+        return random_step(game_grid)
+
+    # Every organism on the grid at the start of the step acts once, in row major order
+    for obj in find_organisms(game_grid):
+        # Skip organisms eaten earlier in the step
+        if is_living(game_grid, obj):
+            game_grid, _ = obj.random_action(game_grid)
     return game_grid
 
 
 def organism_predict_action_step(game_grid):
-    for row in range(len(game_grid)):
-        for column in range(len(game_grid[0])):
-            obj = game_grid[row][column]
-            if type(obj) == Organism:
-                game_grid = obj.act(game_grid)
+    # Every organism on the grid at the start of the step acts once, in row major order
+    organisms = find_organisms(game_grid)
+
+    # Predict for every organism that isn't exploring at once, from the world at the start of the step
+    exploring = [obj.explores() for obj in organisms]
+    predicting = [obj for obj, explores in zip(organisms, exploring) if not explores]
+    if isinstance(game_grid, World):
+        visible_tiles = game_grid.observe_slots(np.array([obj.slot for obj in predicting], dtype=int))
+    else:
+        visible_tiles = np.array([obj._get_visible_tiles(game_grid)[0] for obj in predicting]).reshape((-1, 24))
+    with PROFILER.phase("predict"):
+        act_values = predict_grouped(predicting, visible_tiles)
+
+    predictions = iter(act_values)
+    for obj, explores in zip(organisms, exploring):
+        if not explores:
+            obj_act_values = next(predictions)
+        # Skip organisms eaten earlier in the step
+        if not is_living(game_grid, obj):
+            continue
+        if explores:
+            game_grid = obj.explore(game_grid)
+        else:
+            game_grid = obj.act_from_prediction(game_grid, obj_act_values)
+
+    if isinstance(game_grid, World):
+        game_grid.collect()
     return game_grid
 
 
+def is_living(game_grid, obj):
+    if isinstance(game_grid, World):
+        return game_grid.is_living(obj)
+    return obj.alive and game_grid[obj.row][obj.column] is obj
+
+
 def organisms_left(game_grid):
+    if isinstance(game_grid, World):
+        return game_grid.population()
+
     count = 0
     for row in range(len(game_grid)):
         for column in range(len(game_grid[0])):
@@ -140,7 +363,12 @@ def organisms_left(game_grid):
     return count
 
 
-def create_game_grid(grid_size):
+def create_game_grid(grid_size, engine="grid"):
+    if engine == "array":
+        return World(grid_size)
+    if engine == "chunked":
+        return ChunkedWorld(grid_size)
+
     game_grid = []
     for row in range(grid_size):
         game_grid.append([])
@@ -150,6 +378,14 @@ def create_game_grid(grid_size):
 
 
 def randomly_add_food(game_grid, probability):
+    if isinstance(game_grid, ChunkedWorld):
+        # Never build a mask of the whole grid, pick as many cells as it would have hit
+        game_grid.place_food(*game_grid.random_empty_cells(np.random.binomial(game_grid.free_count, probability)))
+        return game_grid
+    if isinstance(game_grid, World):
+        game_grid.add_food(np.random.random(game_grid.cells.shape) < probability)
+        return game_grid
+
     for row in range(len(game_grid)):
         for column in range(len(game_grid[row])):
             if decision(probability):
@@ -158,6 +394,15 @@ def randomly_add_food(game_grid, probability):
 
 
 def randomly_add_organisms(game_grid, probability, memories=None):
+    if isinstance(game_grid, World):
+        if isinstance(game_grid, ChunkedWorld):
+            rows, columns = game_grid.random_empty_cells(np.random.binomial(game_grid.free_count, probability))
+        else:
+            rows, columns = np.nonzero(np.random.random(game_grid.cells.shape) < probability)
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            game_grid[row][column] = Organism(row, column, memories=memories)
+        return game_grid
+
     for row in range(len(game_grid)):
         for column in range(len(game_grid[row])):
             if decision(probability):
@@ -170,16 +415,6 @@ def randomly_add_organisms(game_grid, probability, memories=None):
     return game_grid
 
 
-def draw_objects(game_grid, screen):
-    for row in range(len(game_grid)):
-        for column in range(len(game_grid[row])):
-            obj = game_grid[row][column]
-            if type(obj) == Food:
-                pygame.draw.rect(screen, obj.color, obj.rect)
-            elif type(obj) == Organism:
-                pygame.draw.rect(screen, obj.color, obj.rect)
-
-
 def decision(probability):
     return random.random() < probability
 
@@ -189,25 +424,66 @@ def add_file_information_to_name(data_location, initial_food_spawn, initial_orga
                str(initial_organism_spawn) + "_" + str(grid_size) + ".csv"
 
 
+def experience_directory(data_location, initial_food_spawn, initial_organism_spawn, grid_size):
+    # The binary experience store is a directory named like the csv file, without the extension
+    return add_file_information_to_name(data_location, initial_food_spawn, initial_organism_spawn, grid_size)[:-len(".csv")]
+
+
 def write_to_csv(data, data_output_location, initial_food_spawn, initial_organism_spawn, grid_size):
     # Expect data format to be
     # {
     #   'id': [[(visible tiles), 'action taken', 'reward that step (difference between energy before/after)']]
     # }
-    history_to_write = []
     filename = add_file_information_to_name(data_output_location, initial_food_spawn, initial_organism_spawn, grid_size)
-    for organism in data:
-        for row in data[organism]:
-            history_to_write.append(row)
-    with open(filename, 'a', newline='') as csvfile:
-        spamwriter = csv.writer(csvfile, delimiter=',',
-                                quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        spamwriter.writerows(history_to_write)
+    if not os.path.exists(index_file_name(filename)) and os.path.exists(filename) and os.path.getsize(filename) > 0:
+        # Rows written before the index existed would otherwise be invisible to read_from_csv
+        build_csv_index(filename)
+    # Rows of each organism are written together, and the index records where they start
+    with open(filename, 'ab') as csvfile, open(index_file_name(filename), 'a', newline='') as indexfile:
+        index_writer = csv.writer(indexfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        offset = csvfile.tell()
+        for organism in data:
+            rows = io.StringIO()
+            spamwriter = csv.writer(rows, delimiter=',',
+                                    quotechar='|', quoting=csv.QUOTE_MINIMAL)
+            spamwriter.writerows(data[organism])
+            encoded_rows = rows.getvalue().encode("UTF-8")
+            csvfile.write(encoded_rows)
+
+            reward_total = sum(row[26] for row in data[organism])
+            index_writer.writerow([organism, offset, len(data[organism]), reward_total])
+            offset += len(encoded_rows)
+
+
+def index_file_name(filename):
+    # Sidecar of the csv log with the byte offset, record count and total reward of each organism
+    return filename + ".index"
+
+
+def build_csv_index(filename):
+    # Index an existing csv log, one entry for each run of consecutive rows with the same id
+    entries = []
+    with open(filename, 'rb') as csvfile:
+        offset = 0
+        for line in csvfile:
+            row = next(csv.reader([line.decode("UTF-8")], delimiter=',', quotechar='|'), None)
+            if row:
+                if entries and entries[-1][0] == row[0]:
+                    entries[-1][2] += 1
+                    entries[-1][3] += int(row[26])
+                else:
+                    entries.append([row[0], offset, 1, int(row[26])])
+            offset += len(line)
+    with open(index_file_name(filename), 'w', newline='') as indexfile:
+        csv.writer(indexfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL).writerows(entries)
 
 
-def read_from_csv(data_location, initial_food_spawn, initial_organism_spawn, grid_size, ids_to_read):
-    memories = {}
+def read_from_csv(data_location, initial_food_spawn, initial_organism_spawn, grid_size, ids_to_read, selection="first"):
     filename = add_file_information_to_name(data_location, initial_food_spawn, initial_organism_spawn, grid_size)
+    if os.path.exists(index_file_name(filename)):
+        return read_indexed_csv(filename, ids_to_read, selection)
+
+    memories = {}
     print("Reading in past memories from log for " + str(ids_to_read) + " ids")
     with open(filename, newline='') as csvfile:
         reader = csv.reader(csvfile, delimiter=',', quotechar='|')
@@ -226,63 +502,62 @@ def read_from_csv(data_location, initial_food_spawn, initial_organism_spawn, gri
 
             if id not in memories:
                 memories[id] = []
-            converted_row = []
-            for index in range(len(row)):
-                if index == len(row) - 1:
-                    converted_row.append(bool(row[index]))
-                elif index == 0:
-                    converted_row.append(row[index])
-                else:
-                    converted_row.append(int(row[index]))
-            visible_tiles = np.array([converted_row[1:25]])
-            action = converted_row[25]
-            reward = converted_row[26]
-            next_visible_tiles = np.array([converted_row[27:51]])
-            done = converted_row[51]
-            new_record = (visible_tiles, action, reward, next_visible_tiles, done)
-            memories[id].append(new_record)
+            memories[id].append(convert_csv_record(row))
     return memories
 
 
-def write_game_states_arguments(grid_size, initial_food_rate, initial_organism_rate, random,  memory_read, max_ids_to_read):
-    # Record the arguments of the game
-    arguments_filename = "data/history_arguments.csv"
-    with open(arguments_filename, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quotechar="|", quoting=csv.QUOTE_MINIMAL)
-        game_arguments = [grid_size, initial_food_rate, initial_organism_rate, random, memory_read, max_ids_to_read]
-        writer.writerow(game_arguments)
+def read_indexed_csv(filename, ids_to_read, selection="first"):
+    # Use the index to seek straight to the records of the chosen organisms
+    print("Reading in past memories from log for " + str(ids_to_read) + " ids")
+    candidates = []
+    with open(index_file_name(filename), newline='') as indexfile:
+        reader = csv.reader(indexfile, delimiter=',', quotechar='|')
+        for organism, offset, count, reward_total in reader:
+            if int(count) >= BATCH_SIZE:
+                candidates.append((organism, int(count), int(reward_total), int(offset)))
+
+    memories = {}
+    with open(filename, 'rb') as csvfile:
+        for organism, count, reward_total, offset in choose_ids(candidates, ids_to_read, selection):
+            csvfile.seek(offset)
+            lines = [csvfile.readline().decode("UTF-8") for record in range(count)]
+            reader = csv.reader(lines, delimiter=',', quotechar='|')
+            memories[organism] = [convert_csv_record(row) for row in reader]
+    return memories
 
 
-def convert_game_states_log(game_states):
-    # Convert game state objects to ints
-    converted_game_states = []
-    for state in game_states:
-        converted_game_states.append(convert_game_state(state))
-    return converted_game_states
+def convert_csv_record(row):
+    converted_row = []
+    for index in range(len(row)):
+        if index == len(row) - 1:
+            converted_row.append(row[index] == "True")
+        elif index == 0:
+            converted_row.append(row[index])
+        else:
+            converted_row.append(int(row[index]))
+    visible_tiles = np.array([converted_row[1:25]])
+    action = converted_row[25]
+    reward = converted_row[26]
+    next_visible_tiles = np.array([converted_row[27:51]])
+    done = converted_row[51]
+    return visible_tiles, action, reward, next_visible_tiles, done
 
 
 def convert_game_state(game_state):
-    converted_game_state = []
-    for row in range(len(game_state) - 1):
-        converted_game_state.append([])
-        for column in range(len(game_state[0]) - 1):
-            if not game_state[row][column]:
-                converted_game_state[row].append(0)
-            elif type(game_state[row][column]) == Food:
-                converted_game_state[row].append(1)
+    # Cell types of the whole grid: 0 for empty, 1 for food and 2 for organisms
+    if isinstance(game_state, World):
+        return game_state.cells
+
+    converted_game_state = np.zeros((len(game_state), len(game_state[0])), dtype=np.int8)
+    for row in range(len(game_state)):
+        for column in range(len(game_state[0])):
+            if type(game_state[row][column]) == Food:
+                converted_game_state[row][column] = FOOD
             elif type(game_state[row][column]) == Organism:
-                converted_game_state[row].append(2)
+                converted_game_state[row][column] = ORGANISM
     return converted_game_state
 
 
-def write_game_states_log(game_states):
-    # Record a single state of the game
-    log_filename = "data/history_log.csv"
-    with open(log_filename, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quotechar="|", quoting=csv.QUOTE_MINIMAL)
-        writer.writerows(game_states)
-
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--games", help="Number of games to play in a row", type=int, default=1)
@@ -292,11 +567,27 @@ if __name__ == '__main__':
     parser.add_argument("--store-data", help="Store the data in a csv", action="store_true")
     parser.add_argument("--data-output-location", help="Where to output the recorded data", default="data/life.csv")
     parser.add_argument("--no-gui", help="Don't render any GUI elements. Useful for quick data collection", action="store_true")
-    parser.add_argument("--random", help="Randomly perform actions instead of prediction", action="store_true")
+    parser.add_argument("--random", help="Randomly perform actions instead of prediction. Short for --policy random", action="store_true")
+    parser.add_argument("--policy", help="What organisms act with. Only the chosen backend is imported, so random never loads a neural network framework", choices=sorted(POLICIES), default=None)
     parser.add_argument("--no-memory-read", help="Don't use log to train network", action="store_true")
     parser.add_argument("--max-ids-to-read", help="The maximum amount of ids to read from the log file", type=int, default=1)
     parser.add_argument("--store-history", help="Store the entire history of the game to replay it at a later time", action="store_true")
+    parser.add_argument("--engine", help="World engine. array keeps the world in numpy arrays, which is much faster on large grids and chunked only stores the occupied parts of very large, sparse grids", choices=["grid", "array", "chunked"], default="grid")
+    parser.add_argument("--data-format", help="Format of the recorded data. npy stores chunks of binary columns in a directory next to the csv location", choices=["csv", "npy"], default="csv")
+    parser.add_argument("--memory-selection", help="Which organisms to read memories of: the first ones written, a random sample or the ones with the best mean reward", choices=["first", "random", "best"], default="first")
+    parser.add_argument("--history-location", help="Where to stream the history of the game to", default=HISTORY_LOCATION)
+    parser.add_argument("--no-history-compression", help="Don't compress the frames of the history log", action="store_true")
+    parser.add_argument("--workers", help="Number of processes to play games in. More than one turns off the GUI", type=int, default=1)
+    parser.add_argument("--seed", help="Seed for the random number generators. Game n is seeded with seed + n", type=int, default=None)
+    parser.add_argument("--food-regrowth-rate", help="Chance of food growing back in an empty cell each step", type=float, default=0.0)
+    parser.add_argument("--food-pattern", help="Where food grows back: anywhere, or mostly in fertile patches", choices=FOOD_PATTERNS, default="uniform")
+    parser.add_argument("--profile", help="Time the phases of every step, write them to a csv and print a breakdown at the end", action="store_true")
+    parser.add_argument("--profile-location", help="Where to write the per step profile to", default=PROFILE_LOCATION)
+    parser.add_argument("--checkpoint-every", help="Save a checkpoint of the game every n steps. 0 never saves one", type=int, default=0)
+    parser.add_argument("--checkpoint-location", help="Where to save checkpoints to", default=CHECKPOINT_LOCATION)
+    parser.add_argument("--resume", help="Checkpoint to carry on the first game from", default=None)
     args = parser.parse_args()
-    main(args.grid_size, args.initial_food_spawn, args.initial_organism_spawn, args.data_output_location, not args.no_gui, args.games, args.random, args.store_data, not args.no_memory_read, args.max_ids_to_read, args.store_history)
+    main(args.grid_size, args.initial_food_spawn, args.initial_organism_spawn, args.data_output_location, not args.no_gui, args.games, args.random, args.store_data, not args.no_memory_read, args.max_ids_to_read, args.store_history, args.engine, args.data_format, args.memory_selection, args.history_location, not args.no_history_compression, args.workers, args.seed, args.checkpoint_every, args.checkpoint_location, args.resume, args.food_regrowth_rate, args.food_pattern,
+         args.profile_location if args.profile else None, args.policy)
 
 
@@ -0,0 +1,168 @@
+import json
+import mmap
+import struct
+import zlib
+
+import numpy as np
+
+HISTORY_MAGIC = b"GOLH"
+HISTORY_VERSION = 2
+# Magic, version, rows, columns, keyframe interval, compressed
+HEADER_FORMAT = "<4sBIIIB"
+# Length of the json game arguments that follow the header, since version 2
+ARGUMENTS_FORMAT = "<I"
+# Frame kind and payload length
+FRAME_FORMAT = "<cI"
+# Offset of the frame index, frame count and magic at the very end of the file
+TRAILER_FORMAT = "<QI4s"
+INDEX_MAGIC = b"GOLI"
+KEYFRAME = b"K"
+DELTA = b"D"
+KEYFRAME_INTERVAL = 100
+BUFFER_SIZE = 1 << 20
+
+
+class HistoryWriter:
+    """
+    Streams the cell types of every step of a game to disk as it is played.
+    Every keyframe_interval frames the full grid is written, and in between only the
+    cells that changed since the previous frame. The game arguments are kept in the header
+    and an index of frame offsets is written on close so replays can seek. The file is
+    flushed on every keyframe, so a crashed run is still replayable up to the last one.
+    """
+    def __init__(self, filename, shape, arguments=None, keyframe_interval=KEYFRAME_INTERVAL, compress=True):
+        self.file = open(filename, "wb", buffering=BUFFER_SIZE)
+        self.shape = shape
+        self.keyframe_interval = keyframe_interval
+        self.compress = compress
+        self.previous = None
+        self.offsets = []
+        self.file.write(struct.pack(HEADER_FORMAT, HISTORY_MAGIC, HISTORY_VERSION, shape[0], shape[1],
+                                    keyframe_interval, compress))
+        encoded_arguments = json.dumps(arguments or {}).encode("UTF-8")
+        self.file.write(struct.pack(ARGUMENTS_FORMAT, len(encoded_arguments)))
+        self.file.write(encoded_arguments)
+
+    def write(self, cells):
+        cells = np.asarray(cells, dtype=np.int8)
+        self.offsets.append(self.file.tell())
+        if (len(self.offsets) - 1) % self.keyframe_interval == 0:
+            self._write_frame(KEYFRAME, cells.tobytes())
+            self.file.flush()
+        else:
+            changed = np.flatnonzero(cells != self.previous)
+            payload = struct.pack("<I", len(changed)) + changed.astype("<i4").tobytes() + \
+                cells.ravel()[changed].tobytes()
+            self._write_frame(DELTA, payload)
+        self.previous = cells.copy()
+
+    def _write_frame(self, kind, payload):
+        if self.compress:
+            payload = zlib.compress(payload)
+        self.file.write(struct.pack(FRAME_FORMAT, kind, len(payload)))
+        self.file.write(payload)
+
+    def close(self):
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.offsets, dtype="<u8").tobytes())
+        self.file.write(struct.pack(TRAILER_FORMAT, index_offset, len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+
+class ReplayReader:
+    """
+    Memory mapped access to the frames of a history file. Frames are only decoded when
+    asked for, starting from the closest keyframe. Files without an index, from a crashed
+    run or an older version, are indexed by walking the frame headers.
+    """
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, rows, columns, keyframe_interval, compressed = struct.unpack_from(HEADER_FORMAT, self.data)
+        if magic != HISTORY_MAGIC:
+            raise Exception(filename + " is not a game history file")
+        self.shape = (rows, columns)
+        self.compressed = compressed
+        position = struct.calcsize(HEADER_FORMAT)
+        self.arguments = {}
+        if version >= 2:
+            arguments_length = struct.unpack_from(ARGUMENTS_FORMAT, self.data, position)[0]
+            position += struct.calcsize(ARGUMENTS_FORMAT)
+            self.arguments = json.loads(self.data[position:position + arguments_length].decode("UTF-8"))
+            position += arguments_length
+
+        self.offsets = self._read_index(version)
+        if self.offsets is None:
+            self.offsets = self._scan_frames(position, len(self.data))
+        self.keyframes = np.array([index for index, offset in enumerate(self.offsets)
+                                   if self.data[offset:offset + 1] == KEYFRAME], dtype=int)
+
+    def _read_index(self, version):
+        trailer_size = struct.calcsize(TRAILER_FORMAT)
+        if version < 2 or len(self.data) < trailer_size:
+            return None
+        index_offset, frame_count, magic = struct.unpack_from(TRAILER_FORMAT, self.data, len(self.data) - trailer_size)
+        if magic != INDEX_MAGIC:
+            return None
+        return np.frombuffer(self.data, dtype="<u8", count=frame_count, offset=index_offset).astype(int).tolist()
+
+    def _scan_frames(self, position, end):
+        # Stop at the end of the data or at a frame that was only partially written
+        offsets = []
+        frame_header_size = struct.calcsize(FRAME_FORMAT)
+        while position + frame_header_size <= end:
+            kind, length = struct.unpack_from(FRAME_FORMAT, self.data, position)
+            if kind not in (KEYFRAME, DELTA) or position + frame_header_size + length > end:
+                break
+            offsets.append(position)
+            position += frame_header_size + length
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _payload(self, index):
+        offset = self.offsets[index]
+        kind, length = struct.unpack_from(FRAME_FORMAT, self.data, offset)
+        start = offset + struct.calcsize(FRAME_FORMAT)
+        payload = self.data[start:start + length]
+        if self.compressed:
+            payload = zlib.decompress(payload)
+        return kind, payload
+
+    def frame(self, index, previous=None):
+        """
+        The cell types of a frame. previous can be an (index, cells) pair of an earlier frame
+        to decode forward from instead of going back to the keyframe
+        """
+        keyframe = self.keyframes[np.searchsorted(self.keyframes, index, side="right") - 1]
+        if previous is not None and keyframe <= previous[0] <= index:
+            start, cells = previous[0] + 1, previous[1].ravel().copy()
+        else:
+            start, cells = keyframe, None
+
+        for position in range(start, index + 1):
+            kind, payload = self._payload(position)
+            if kind == KEYFRAME:
+                cells = np.frombuffer(payload, dtype=np.int8).copy()
+            else:
+                count = struct.unpack_from("<I", payload)[0]
+                changed = np.frombuffer(payload, dtype="<i4", count=count, offset=4)
+                cells[changed] = np.frombuffer(payload, dtype=np.int8, count=count, offset=4 + 4 * count)
+        return cells.reshape(self.shape)
+
+    def close(self):
+        self.data.close()
+
+
+def read_history(filename):
+    """
+    Yield the cell types of every frame of a history file in order
+    """
+    reader = ReplayReader(filename)
+    previous = None
+    for index in range(len(reader)):
+        cells = reader.frame(index, previous)
+        previous = (index, cells)
+        yield cells
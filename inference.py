@@ -0,0 +1,56 @@
+import numpy as np
+
+from profiler import PROFILER
+
+# Numpy versions of the activations a genome can choose, matching keras.activations of the
+# Keras 2 pinned in requirements.txt. Keras 3 changed hard_sigmoid to relu6(x + 3) / 6
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0),
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+    'softplus': lambda x: np.logaddexp(0, x),
+    'linear': lambda x: x,
+}
+
+
+def model_activations(model):
+    return [layer.get_config()['activation'] for layer in model.layers]
+
+
+def forward(kernels, biases, activations, x):
+    """
+    Forward pass of a stack of Dense layers over a batch of observations
+    """
+    x = np.asarray(x, dtype=np.float32)
+    for kernel, bias, activation in zip(kernels, biases, activations):
+        x = ACTIVATIONS[activation](x @ kernel + bias)
+    return x
+
+
+def predict_grouped(organisms, visible_tiles):
+    """
+    Predict the action values of many organisms at once.
+    Organisms are grouped by genome hash and layer shapes, the weights of each group are
+    stacked and the whole group goes through a single batched forward pass.
+    Returns a (1, action_size) array per organism, like model.predict on one observation.
+    """
+    layers = [organism.model.layers_arrays() for organism in organisms]
+    groups = {}
+    for index, organism in enumerate(organisms):
+        architecture = (organism.genome.hash, tuple(kernel.shape for kernel in layers[index][0]))
+        groups.setdefault(architecture, []).append(index)
+
+    act_values = [None] * len(organisms)
+    PROFILER.count("predict_calls", len(groups))
+    for indexes in groups.values():
+        activations = organisms[indexes[0]].model.activations
+        x = np.asarray(visible_tiles, dtype=np.float32)[indexes][:, None, :]
+        for layer, activation in enumerate(activations):
+            kernels = np.stack([layers[index][0][layer] for index in indexes])
+            biases = np.stack([layers[index][1][layer] for index in indexes])
+            x = ACTIVATIONS[activation](np.matmul(x, kernels) + biases[:, None, :])
+        for position, index in enumerate(indexes):
+            act_values[index] = x[position]
+    return act_values
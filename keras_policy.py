@@ -0,0 +1,53 @@
+from keras.models import Sequential
+from keras.layers import Dense
+from keras.optimizers import Adam
+
+from model_factory import MODEL_FACTORY
+
+
+class KerasPolicy:
+    """
+    Deep Q learning on a Keras network built from the organism's genome. Organisms with the
+    same genome hash share one compiled model, see ModelFactory
+    """
+    name = "keras"
+    predicts = True
+
+    def new_model(self, organism):
+        return MODEL_FACTORY.model_for(organism.genome.hash, lambda: build_model(organism, organism.genome.geneparam))
+
+
+def build_model_simple(organism):
+    """
+    A simple model not using genes
+    """
+    model = Sequential()
+    model.add(Dense(24, input_dim=organism.state_size, activation='relu'))
+    model.add(Dense(24, activation='relu'))
+    model.add(Dense(organism.action_size, activation='linear'))
+    model.compile(loss='mse',
+                  optimizer=Adam(learning_rate=organism.learning_rate))
+    return model
+
+
+def build_model(organism, gene_param):
+    """
+    Build the neural network from the given gene parameters
+    """
+    nb_layers = len(gene_param)
+
+    model = Sequential()
+
+    for i in range(nb_layers - 1):
+        nb_neurons = gene_param['layers'][i]['nb_neurons']
+        activation = gene_param['layers'][i]['activation']
+
+        if i == 0:
+            model.add(Dense(nb_neurons, input_dim=organism.state_size, activation=activation))
+        else:
+            model.add(Dense(nb_neurons, activation=activation))
+
+    model.add(Dense(organism.action_size, activation='linear'))
+    model.compile(loss='mse',
+                  optimizer=Adam(learning_rate=organism.learning_rate))
+    return model
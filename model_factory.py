@@ -0,0 +1,116 @@
+import random
+from collections import OrderedDict
+
+import numpy as np
+
+from inference import forward, model_activations
+
+# Number of compiled architectures kept around for new organisms
+MODEL_CACHE_SIZE = 32
+
+
+class SharedModel:
+    """
+    An organism's own weights and optimizer state on top of a compiled model that is shared
+    by every organism with the same genome hash. Both are swapped into the shared model only
+    to train it, so every organism keeps its own optimizer moments and iteration count.
+    Predictions never touch Keras, they are a numpy forward pass over contiguous copies of
+    the weights that are kept until the weights change.
+    """
+    def __init__(self, template, weights, activations, optimizer_state):
+        self.template = template
+        self.weights = weights
+        self.activations = activations
+        self.optimizer_state = optimizer_state
+        # Bumped whenever the weights change, so the arrays used for predictions are rebuilt
+        self.version = 0
+        self._arrays = None
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, weights):
+        self.weights = [np.array(weight) for weight in weights]
+        self.version += 1
+
+    def get_optimizer_state(self):
+        return self.optimizer_state
+
+    def set_optimizer_state(self, optimizer_state):
+        self.optimizer_state = [np.array(value) for value in optimizer_state]
+
+    def layers_arrays(self):
+        """
+        The kernels and biases of every layer as contiguous float32 arrays
+        """
+        if self._arrays is None or self._arrays[0] != self.version:
+            kernels = [np.ascontiguousarray(weight, dtype=np.float32) for weight in self.weights[0::2]]
+            biases = [np.ascontiguousarray(weight, dtype=np.float32) for weight in self.weights[1::2]]
+            self._arrays = (self.version, kernels, biases)
+        return self._arrays[1:]
+
+    def predict(self, x, **kwargs):
+        kernels, biases = self.layers_arrays()
+        return forward(kernels, biases, self.activations, x)
+
+    def fit(self, x, y, **kwargs):
+        variables = self.template.optimizer.variables
+        self.template.set_weights(self.weights)
+        for variable, value in zip(variables, self.optimizer_state):
+            variable.assign(value)
+        history = self.template.fit(x, y, **kwargs)
+        self.weights = self.template.get_weights()
+        self.optimizer_state = [variable.numpy() for variable in variables]
+        self.version += 1
+        return history
+
+
+class ModelFactory:
+    """
+    Builds and compiles one model per genome hash and keeps the most recently used ones in
+    a bounded LRU cache. Every organism gets a SharedModel with freshly initialised weights
+    and the optimizer state the model had before it was ever trained.
+    """
+    def __init__(self, cache_size=MODEL_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.templates = OrderedDict()
+
+    def model_for(self, genome_hash, build_model):
+        if genome_hash in self.templates:
+            self.templates.move_to_end(genome_hash)
+            template, activations, optimizer_state = self.templates[genome_hash]
+            return SharedModel(template, initial_weights(template), activations, optimizer_state)
+
+        # Keras draws layer seeds from the random module, which would shift the game's random
+        # numbers depending on what is in the cache
+        random_state = random.getstate()
+        template = build_model()
+        random.setstate(random_state)
+        activations = model_activations(template)
+        # Create the optimizer's slots now, so there is a fresh state to hand to every organism
+        template.optimizer.build(template.trainable_variables)
+        optimizer_state = [variable.numpy() for variable in template.optimizer.variables]
+        self.templates[genome_hash] = (template, activations, optimizer_state)
+        if len(self.templates) > self.cache_size:
+            self.templates.popitem(last=False)
+        # Drawn the same way as for cached templates, so the random numbers used don't depend
+        # on what is in the cache and seeded or resumed games play out the same
+        return SharedModel(template, initial_weights(template), activations, optimizer_state)
+
+
+def initial_weights(model):
+    """
+    New weights for a model of Dense layers, using the Keras defaults of glorot uniform
+    kernels and zero biases
+    """
+    weights = []
+    for weight in model.get_weights():
+        if weight.ndim == 2:
+            limit = np.sqrt(6 / (weight.shape[0] + weight.shape[1]))
+            weights.append(np.random.uniform(-limit, limit, weight.shape).astype(weight.dtype))
+        else:
+            weights.append(np.zeros_like(weight))
+    return weights
+
+
+MODEL_FACTORY = ModelFactory()
@@ -2,32 +2,31 @@ import uuid
 import numpy as np
 import random
 from collections import deque
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.optimizers import Adam
 
+import constants
+from constants import ORGANISM_COLOR, ORGANISM_WIDTH, ORGANISM_HEIGHT, INITIAL_ENERGY, ATTEMPT_LIMIT, \
+    ENERGY_FROM_MOVING, ENERGY_FROM_MATING, REWARD_FROM_EATING, \
+    REWARD_FROM_MOVING, REWARD_FROM_MATING, REWARD_FROM_DYING, BATCH_SIZE, MUTATE_CHANCE
 from food import Food
 from genome import Genome
-
-ORGANISM_COLOR = (0, 0, 255)
-ORGANISM_WIDTH = 10
-ORGANISM_HEIGHT = 10
-INITIAL_ENERGY = 100
-MAX_ENERGY = 200
-ENERGY_FROM_EATING = 50
-ATTEMPT_LIMIT = 50
-ENERGY_FROM_MOVING = -1
-ENERGY_FROM_MATING = -1
-# Rewards for model
-REWARD_FROM_EATING = 100
-REWARD_FROM_MOVING = -1
-REWARD_FROM_MATING = 50
-REWARD_FROM_DYING = -1000
-BATCH_SIZE = 32
-MUTATE_CHANCE = 0.01
+from policies import current_policy
+from pretrain_store import PRETRAIN_STORE
+from vision import grid_visible_tiles
+from world import World, WorldField
+from profiler import PROFILER
 
 
 class Organism:
+    # Position and vitals are read from the World arrays once placed in one
+    row = WorldField(int)
+    column = WorldField(int)
+    energy = WorldField(int)
+    alive = WorldField(bool)
+    world = None
+    slot = None
+    # Babies born in this process, for game summaries
+    births = 0
+
     def __init__(self, row, column, state_size=24, action_size=13, genome=None, memories=None):
         self.id = str(uuid.uuid4())
         self.color = ORGANISM_COLOR
@@ -52,28 +51,26 @@ class Organism:
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.995
         self.learning_rate = 0.001
-        self.model = self._build_model(self.genome.geneparam)
+        # None when the policy acts without a model
+        self.model = current_policy().new_model(self)
         self.past_memories = memories
-        if self.past_memories:
+        if self.past_memories and self.model is not None and not PRETRAIN_STORE.load(self):
             self.train_from_initial(self.past_memories)
+            PRETRAIN_STORE.save(self)
 
     def _get_visible_tiles(self, game_grid, organism_row=None, organism_column=None):
-        if not organism_row:
-            organism_row = self.row
-        if not organism_column:
-            organism_column = self.column
-
-        visible = []
-        for row_change in range(-2, 3):
-            for col_change in range(-2, 3):
-                if row_change == 0 and col_change == 0:
-                    continue
-                elif self._out_of_bounds(game_grid, organism_row + row_change, organism_column + col_change):
-                    visible.append(-1)
-                else:
-                    visible.append(self._convert_obj_to_int_mapping(game_grid[organism_row + row_change][organism_column + col_change]))
-        numpy_visible = np.array(visible).reshape((1, 24))
-        return numpy_visible
+        with PROFILER.phase("visible_tiles"):
+            if isinstance(game_grid, World) and organism_row is None and organism_column is None:
+                return game_grid.visible_tiles(self)
+
+            if not organism_row:
+                organism_row = self.row
+            if not organism_column:
+                organism_column = self.column
+
+            if isinstance(game_grid, World):
+                return game_grid.observations([organism_row], [organism_column])
+            return grid_visible_tiles(game_grid, organism_row, organism_column, self._convert_obj_to_int_mapping)
 
     def _convert_obj_to_int_mapping(self, obj):
         if obj == -1:
@@ -100,6 +97,7 @@ class Organism:
             return False
 
     def _die(self, game_grid):
+        PROFILER.count("deaths")
         self.alive = False
         game_grid[self.row][self.column] = None
         return game_grid
@@ -144,9 +142,11 @@ class Organism:
         elif not game_grid[row][column]:
             return False
 
-        self.energy += ENERGY_FROM_EATING
-        if self.energy > MAX_ENERGY:
-            self.energy = MAX_ENERGY
+        if PROFILER.enabled and type(game_grid[row][column]) == Organism:
+            PROFILER.count("deaths")
+        self.energy += constants.ENERGY_FROM_EATING
+        if self.energy > constants.MAX_ENERGY:
+            self.energy = constants.MAX_ENERGY
 
         game_grid[row][column] = None
         return game_grid
@@ -168,21 +168,41 @@ class Organism:
             return False
         elif type(game_grid[row][column]) != Organism:
             return False
+
+        # Random placement of baby. Can't mate if there is no room for it
+        with PROFILER.phase("mate_placement"):
+            cell = self._random_empty_cell(game_grid)
+        if cell is None:
+            return False
+
         self.energy += ENERGY_FROM_MATING
         if self.energy <= 0:
             return self._die(game_grid)
 
-        # Random placement of baby
-        searching = True
-        while searching:
-            random_row = np.random.randint(0, len(game_grid) - 1)
-            random_col = np.random.randint(0, len(game_grid[0]) - 1)
-            if not game_grid[random_row][random_col]:
-                genome = self._combine_genomes(game_grid[row][column], self)
-                game_grid[random_row][random_col] = Organism(random_row, random_col, genome=genome, memories=self.past_memories)
-                searching = False
+        random_row, random_col = cell
+        genome = self._combine_genomes(game_grid[row][column], self)
+        game_grid[random_row][random_col] = Organism(random_row, random_col, genome=genome, memories=self.past_memories)
+        Organism.births += 1
+        PROFILER.count("births")
         return game_grid
 
+    def _random_empty_cell(self, game_grid):
+        if isinstance(game_grid, World):
+            return game_grid.random_free_cell()
+
+        for attempt in range(ATTEMPT_LIMIT):
+            random_row = np.random.randint(0, len(game_grid))
+            random_col = np.random.randint(0, len(game_grid[0]))
+            if not game_grid[random_row][random_col]:
+                return random_row, random_col
+
+        # Crowded grid, pick from all of the empty cells instead
+        empty_cells = [(row, column) for row in range(len(game_grid)) for column in range(len(game_grid[0]))
+                       if not game_grid[row][column]]
+        if not empty_cells:
+            return None
+        return random.choice(empty_cells)
+
     def _combine_genomes(self, mom, dad):
         child_gene = {}
         mom_gene = mom.genome.geneparam
@@ -240,6 +260,7 @@ class Organism:
                 return new_grid, reward
             else:
                 attempt += 1
+                PROFILER.count("action_retries")
         self.remember(visible_tiles, 12, reward, visible_tiles, False)
         return self.do_nothing(game_grid), reward
 
@@ -285,51 +306,32 @@ class Organism:
 
         return new_grid, reward
 
-    def _build_model_simple(self):
-        """
-        A simple model not using genes
-        """
-        model = Sequential()
-        model.add(Dense(24, input_dim=self.state_size, activation='relu'))
-        model.add(Dense(24, activation='relu'))
-        model.add(Dense(self.action_size, activation='linear'))
-        model.compile(loss='mse',
-                      optimizer=Adam(lr=self.learning_rate))
-        return model
-
-    def _build_model(self, gene_param):
-        """
-        Build the neural network from the given gene parameters
-        """
-        nb_layers = len(gene_param)
-
-        model = Sequential()
-
-        for i in range(nb_layers - 1):
-            nb_neurons = gene_param['layers'][i]['nb_neurons']
-            activation = gene_param['layers'][i]['activation']
-
-            if i == 0:
-                model.add(Dense(nb_neurons, input_dim=self.state_size, activation=activation))
-            else:
-                model.add(Dense(nb_neurons, activation=activation))
-
-        model.add(Dense(self.action_size, activation='linear'))
-        model.compile(loss='mse',
-                      optimizer=Adam(lr=self.learning_rate))
-        return model
-
     def remember(self, state, action, reward, next_state, done):
         self.memory.append((state, action, reward, next_state, done))
 
-    def act_from_prediction(self, state):
-        if np.random.rand() <= self.epsilon:
-            print("Random action for " + str(self.id))
-            new_state, reward = self.random_action(state)
-            return new_state
+    def explores(self):
+        return np.random.rand() <= self.epsilon
 
+    def explore(self, state):
+        print("Random action for " + str(self.id))
+        new_state, reward = self.random_action(state)
+        return new_state
+
+    def act_from_prediction(self, state, act_values=None):
+        """
+        Do the best possible predicted action. act_values can be given when the prediction
+        was already made for many organisms at once. The remembered state is always what the
+        organism sees now, which differs from what it was predicted from when neighbours
+        acted in between
+        """
+        if act_values is None and self.explores():
+            return self.explore(state)
         visible_tiles = self._get_visible_tiles(state)
-        act_values = self.model.predict(visible_tiles)
+        if act_values is None:
+            with PROFILER.phase("predict"):
+                act_values = self.model.predict(visible_tiles)
+            PROFILER.count("predict_calls")
+
         # Do the action with the highest value that is possible
         sorted_actions = np.argsort(act_values[0])
         print("Predicted action for " + str(self.id))
@@ -340,6 +342,7 @@ class Organism:
                 done = reward == REWARD_FROM_DYING
                 self.remember(visible_tiles, action, reward, new_visible_tiles, done)
                 return new_state
+            PROFILER.count("action_retries")
 
     def act(self, state):
         new_state = self.act_from_prediction(state)
@@ -353,15 +356,27 @@ class Organism:
         if len(memory) < batch_size:
             return
 
-        minibatch = random.sample(memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                target = reward + self.gamma * \
-                                  np.amax(self.model.predict(next_state)[0])
-            target_f = self.model.predict(state)
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=1, verbose=0)
+        with PROFILER.phase("replay"):
+            self._replay_batch(memory, batch_size)
+
+    def _replay_batch(self, memory, batch_size):
+        if hasattr(memory, 'batch'):
+            # Memories read from the binary experience store come out already stacked
+            states, actions, rewards, next_states, dones = memory.batch(np.random.choice(len(memory), batch_size, replace=False))
+        else:
+            minibatch = random.sample(memory, batch_size)
+            states = np.concatenate([state for state, action, reward, next_state, done in minibatch])
+            actions = np.array([action for state, action, reward, next_state, done in minibatch], dtype=int)
+            rewards = np.array([reward for state, action, reward, next_state, done in minibatch], dtype=float)
+            next_states = np.concatenate([next_state for state, action, reward, next_state, done in minibatch])
+            dones = np.array([done for state, action, reward, next_state, done in minibatch], dtype=bool)
+
+        # Train on the whole minibatch with one predict for each side and a single fit
+        targets = rewards + self.gamma * np.amax(self.model.predict(next_states, batch_size=batch_size), axis=1)
+        targets[dones] = rewards[dones]
+        target_f = self.model.predict(states, batch_size=batch_size)
+        target_f[np.arange(batch_size), actions] = targets
+        self.model.fit(states, target_f, batch_size=batch_size, epochs=1, verbose=0)
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
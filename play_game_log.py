@@ -1,52 +1,136 @@
 import argparse
 import sys
 import csv
+import queue
+import threading
 import pygame
 import ast
+import numpy as np
 
-from food import FOOD_COLOR, FOOD_WIDTH, FOOD_HEIGHT
-from game import SCREEN_BACKGROUND
-from organism import ORGANISM_WIDTH, ORGANISM_HEIGHT, ORGANISM_COLOR
+from history import ReplayReader
+from renderer import Renderer
 
 
 FRAME_RATE = 30
-
-
-def main(arguments_file, input_file):
-    grid_size, initial_food_rate, initial_organism_rate, random, memory_read, max_ids_to_read = read_argument_file(arguments_file)
-    game_states = read_game_states(input_file)
-
+# Frames decoded ahead of the one on screen
+PREFETCH_FRAMES = 64
+# Frames jumped by the left and right arrow keys
+SEEK_FRAMES = 100
+
+
+class CsvReplay:
+    """
+    Frames of an old csv history log, with the same frame access as ReplayReader
+    """
+    def __init__(self, input_file):
+        self.game_states = [np.array(state, dtype=np.int8) for state in read_game_states(input_file)]
+
+    def __len__(self):
+        return len(self.game_states)
+
+    def frame(self, index, previous=None):
+        return self.game_states[index]
+
+
+class FramePrefetcher:
+    """
+    Decodes the frames from start onwards, every stride frames, on a background thread
+    """
+    def __init__(self, reader, start, stride):
+        self.reader = reader
+        self.frames = queue.Queue(maxsize=PREFETCH_FRAMES)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._decode, args=(start, stride), daemon=True)
+        self.thread.start()
+
+    def _decode(self, start, stride):
+        previous = None
+        for index in range(start, len(self.reader), stride):
+            cells = self.reader.frame(index, previous)
+            previous = (index, cells)
+            if not self._put((index, cells)):
+                return
+        # Marks the end of the replay
+        self._put((None, None))
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        return self.frames.get()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main(arguments_file, input_file, skip=1, start=0):
+    if input_file.endswith(".csv"):
+        grid_size, initial_food_rate, initial_organism_rate, random, memory_read, max_ids_to_read = read_argument_file(arguments_file)
+        reader = CsvReplay(input_file)
+    else:
+        # Arguments are in the header, frames are decoded lazily from the memory mapped file
+        reader = ReplayReader(input_file)
+
+    # Logs of the old csv writer hold (grid_size - 1) square frames, so size everything from the frames
+    shape = reader.frame(0).shape
     pygame.init()
-    size = width, height = grid_size * 10, grid_size * 10
+    size = width, height = shape[0] * 10, shape[1] * 10
     screen = pygame.display.set_mode(size)
+    renderer = Renderer(screen, shape)
     clock = pygame.time.Clock()
 
     print("Starting game sim")
-    for state in game_states:
-        clock.tick(FRAME_RATE)
+    print("Space pauses, left and right arrows seek, up and down change speed, + and - change frame skip")
+    position = start
+    speed = 1
+    paused = False
+    prefetcher = FramePrefetcher(reader, position, skip)
+    while True:
+        clock.tick(FRAME_RATE * speed)
+        restart = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 sys.exit()
-
-        screen.fill(SCREEN_BACKGROUND)
-        draw_objects(state, screen)
-        pygame.display.flip()
-
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_RIGHT:
+                    position, restart = min(position + SEEK_FRAMES, len(reader) - 1), True
+                elif event.key == pygame.K_LEFT:
+                    position, restart = max(position - SEEK_FRAMES, 0), True
+                elif event.key == pygame.K_UP:
+                    speed = min(speed * 2, 64)
+                elif event.key == pygame.K_DOWN:
+                    speed = max(speed / 2, 1 / 8)
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    skip, restart = skip * 2, True
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    skip, restart = max(skip // 2, 1), True
+
+        if restart:
+            prefetcher.stop()
+            prefetcher = FramePrefetcher(reader, position, skip)
+            paused = False
+        if paused:
+            continue
+
+        index, state = prefetcher.get()
+        if index is None:
+            break
+        position = index
+
+        renderer.draw(state)
+
+    prefetcher.stop()
     pygame.quit()
 
 
-def draw_objects(game_state, screen):
-    for row in range(len(game_state) - 1):
-        for column in range(len(game_state[0]) - 1):
-            obj = game_state[row][column]
-            if obj == 1:
-                food_rect = [row * FOOD_WIDTH, column * FOOD_HEIGHT, FOOD_WIDTH, FOOD_HEIGHT]
-                pygame.draw.rect(screen, FOOD_COLOR, food_rect)
-            elif obj == 2:
-                organism_rect = [row * ORGANISM_WIDTH, column * ORGANISM_HEIGHT, ORGANISM_WIDTH, ORGANISM_HEIGHT]
-                pygame.draw.rect(screen, ORGANISM_COLOR, organism_rect)
-
-
 def read_game_states(input_file):
     print("Reading in game states")
     game_states = []
@@ -77,6 +161,8 @@ def read_argument_file(arguments_file):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input-file", help="States log file to replay")
-    parser.add_argument("-a", "--arg-file", help="File with arguments of game")
+    parser.add_argument("-a", "--arg-file", help="File with arguments of game. Only needed for csv logs")
+    parser.add_argument("--skip", help="Only show every nth frame", type=int, default=1)
+    parser.add_argument("--start", help="Frame to start playing from", type=int, default=0)
     args = parser.parse_args()
-    main(args.arg_file, args.input_file)
\ No newline at end of file
+    main(args.arg_file, args.input_file, args.skip, args.start)
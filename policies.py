@@ -0,0 +1,33 @@
+import importlib
+
+# Policy backends by name, as the module and class to import the first time one is used.
+# Modules are only imported then, so games that never use a framework never load it
+POLICIES = {
+    "random": ("random_policy", "RandomPolicy"),
+    "keras": ("keras_policy", "KerasPolicy"),
+}
+DEFAULT_POLICY = "keras"
+
+# Policy new organisms get their models from, see use_policy
+POLICY = None
+
+
+def load_policy(name):
+    module, class_name = POLICIES[name]
+    return getattr(importlib.import_module(module), class_name)()
+
+
+def use_policy(name):
+    """
+    Make the named policy the one new organisms are created with and return it
+    """
+    global POLICY
+    if POLICY is None or POLICY.name != name:
+        POLICY = load_policy(name)
+    return POLICY
+
+
+def current_policy():
+    if POLICY is None:
+        return use_policy(DEFAULT_POLICY)
+    return POLICY
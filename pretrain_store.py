@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+import numpy as np
+
+PRETRAINED_LOCATION = "data/pretrained"
+
+
+class PretrainStore:
+    """
+    Weights and optimizer state trained from past memories, keyed by genome hash and a
+    fingerprint of the memories. Kept in memory and saved under data/ so train_from_initial only has to
+    run once per architecture and set of memories, across organisms and processes.
+    """
+    def __init__(self, location=PRETRAINED_LOCATION):
+        self.location = location
+        self.trained = {}
+        self.fingerprints = {}
+
+    def fingerprint(self, memories):
+        """
+        Hash of the organism ids, record counts and first and last record of each organism
+        """
+        cached = self.fingerprints.get(id(memories))
+        if cached and cached[0] is memories:
+            return cached[1]
+
+        digest = hashlib.md5()
+        for organism_id in sorted(memories):
+            records = memories[organism_id]
+            digest.update((str(organism_id) + ":" + str(len(records))).encode("UTF-8"))
+            for state, action, reward, next_state, done in (records[0], records[-1]):
+                digest.update(np.asarray(state, dtype=np.int8).tobytes())
+                digest.update(np.asarray(next_state, dtype=np.int8).tobytes())
+                digest.update(str((int(action), int(reward), bool(done))).encode("UTF-8"))
+        fingerprint = digest.hexdigest()
+        self.fingerprints[id(memories)] = (memories, fingerprint)
+        return fingerprint
+
+    def _filename(self, key):
+        return os.path.join(self.location, key[0] + "_" + key[1] + ".npz")
+
+    def load(self, organism):
+        """
+        Give the organism the stored weights, optimizer state and epsilon for its genome and
+        memories. Returns False if they haven't been trained yet
+        """
+        key = (organism.genome.hash, self.fingerprint(organism.past_memories))
+        if key not in self.trained:
+            filename = self._filename(key)
+            if not os.path.exists(filename):
+                return False
+            with np.load(filename) as data:
+                weights = [data["weight_" + str(index)] for index in range(count_arrays(data, "weight_"))]
+                optimizer_state = [data["optimizer_" + str(index)] for index in range(count_arrays(data, "optimizer_"))]
+                self.trained[key] = (weights, optimizer_state, float(data["epsilon"]))
+
+        weights, optimizer_state, epsilon = self.trained[key]
+        shapes = [weight.shape for weight in organism.model.get_weights()]
+        optimizer_shapes = [value.shape for value in organism.model.get_optimizer_state()]
+        if shapes != [weight.shape for weight in weights] or optimizer_shapes != [value.shape for value in optimizer_state]:
+            return False
+        organism.model.set_weights(weights)
+        organism.model.set_optimizer_state(optimizer_state)
+        organism.epsilon = epsilon
+        return True
+
+    def save(self, organism):
+        key = (organism.genome.hash, self.fingerprint(organism.past_memories))
+        weights = [np.array(weight) for weight in organism.model.get_weights()]
+        optimizer_state = [np.array(value) for value in organism.model.get_optimizer_state()]
+        self.trained[key] = (weights, optimizer_state, organism.epsilon)
+
+        os.makedirs(self.location, exist_ok=True)
+        arrays = {"weight_" + str(index): weight for index, weight in enumerate(weights)}
+        arrays.update({"optimizer_" + str(index): value for index, value in enumerate(optimizer_state)})
+        # Write to a temporary file first so other processes never read a partial file
+        temporary_filename = self._filename(key) + "." + str(os.getpid()) + ".tmp"
+        with open(temporary_filename, "wb") as file:
+            np.savez(file, epsilon=organism.epsilon, **arrays)
+        os.replace(temporary_filename, self._filename(key))
+
+
+def count_arrays(data, prefix):
+    return len([name for name in data.files if name.startswith(prefix)])
+
+
+PRETRAIN_STORE = PretrainStore()
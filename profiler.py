@@ -0,0 +1,107 @@
+import csv
+import time
+
+# Timed phases of a step. Phases can run inside others, so the time of predict is also
+# part of actions, and visible_tiles part of whatever asked for them
+PHASES = ["actions", "predict", "visible_tiles", "mate_placement", "replay", "food_growth", "store_data",
+          "history", "draw", "checkpoint"]
+COUNTERS = ["predict_calls", "action_retries", "births", "deaths"]
+
+
+class Phase:
+    """
+    Adds the time spent inside a with block to its phase. A phase can't be nested in itself
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.profiler.times[self.name] += time.perf_counter() - self.start
+
+
+class NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exception):
+        pass
+
+
+NULL_PHASE = NullPhase()
+
+
+class Profiler:
+    """
+    Phase timers and event counters for the step loop. While disabled, phase hands out a
+    shared do nothing context manager and count returns straight away, so the hooks left
+    in the hot paths cost next to nothing. When enabled, every step is written as a row of
+    a csv trace and a breakdown of the whole game is printed when it is stopped.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.phases = {name: Phase(self, name) for name in PHASES}
+        self._reset()
+
+    def _reset(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def start(self, location):
+        self.enabled = True
+        self._reset()
+        self.total_times = dict.fromkeys(PHASES, 0.0)
+        self.total_counts = dict.fromkeys(COUNTERS, 0)
+        self.steps = 0
+        self.total_step_time = 0.0
+        self.file = open(location, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["step", "step_time"] + PHASES + COUNTERS)
+        self.step_start = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return self.phases[name]
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counts[name] += amount
+
+    def end_step(self, step):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        step_time = now - self.step_start
+        self.step_start = now
+        self.writer.writerow([step, step_time] + [self.times[name] for name in PHASES] +
+                             [self.counts[name] for name in COUNTERS])
+        self.steps += 1
+        self.total_step_time += step_time
+        for name in PHASES:
+            self.total_times[name] += self.times[name]
+        for name in COUNTERS:
+            self.total_counts[name] += self.counts[name]
+        self._reset()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.file.close()
+        print("Profile of " + str(self.steps) + " steps, " + str(round(self.total_step_time, 3)) + " seconds")
+        for name in PHASES:
+            if self.total_times[name] == 0:
+                continue
+            share = 100 * self.total_times[name] / self.total_step_time if self.total_step_time else 0
+            print("  " + name.ljust(16) + str(round(self.total_times[name], 3)).rjust(10) + " s " +
+                  str(round(share, 1)).rjust(6) + " %")
+        for name in COUNTERS:
+            print("  " + name.ljust(16) + str(self.total_counts[name]).rjust(10))
+
+
+PROFILER = Profiler()
@@ -0,0 +1,9 @@
+class RandomPolicy:
+    """
+    Organisms act at random and have no model, so nothing is built, trained or predicted
+    """
+    name = "random"
+    predicts = False
+
+    def new_model(self, organism):
+        return None
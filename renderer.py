@@ -0,0 +1,51 @@
+import numpy as np
+import pygame
+
+from food import FOOD_COLOR, FOOD_WIDTH, FOOD_HEIGHT
+from constants import ORGANISM_COLOR
+
+SCREEN_BACKGROUND = 0, 0, 0
+# Size of a cell on screen
+CELL_WIDTH = FOOD_WIDTH
+CELL_HEIGHT = FOOD_HEIGHT
+# Frames with at most this many changed cells only redraw those cells
+DIRTY_CELL_LIMIT = 256
+# Color of each cell type: empty, food, organism
+CELL_COLORS = np.array([SCREEN_BACKGROUND, FOOD_COLOR, ORGANISM_COLOR], dtype=np.uint8)
+
+
+class Renderer:
+    """
+    Draws arrays of cell types onto the screen. The cells are mapped through a color lookup
+    table into a pixel per cell, uploaded with surfarray and scaled up to the window in a
+    single blit. When only a few cells changed since the last frame just those are redrawn.
+    """
+    def __init__(self, screen, shape):
+        self.screen = screen
+        self.colors = CELL_COLORS
+        # Surfaces are indexed (x, y), which is (row, column) like the grid
+        self.cells_surface = pygame.Surface(shape)
+        self.previous = None
+
+    def draw(self, cells):
+        cells = np.asarray(cells)
+        if self.previous is not None:
+            changed = np.flatnonzero(cells != self.previous)
+            if len(changed) <= DIRTY_CELL_LIMIT:
+                self._draw_cells(cells, changed)
+                return
+
+        pygame.surfarray.blit_array(self.cells_surface, self.colors[cells])
+        pygame.transform.scale(self.cells_surface, self.screen.get_size(), self.screen)
+        pygame.display.flip()
+        self.previous = cells.copy()
+
+    def _draw_cells(self, cells, changed):
+        rows, columns = np.divmod(changed, cells.shape[1])
+        rects = []
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            rect = pygame.Rect(row * CELL_WIDTH, column * CELL_HEIGHT, CELL_WIDTH, CELL_HEIGHT)
+            self.screen.fill(self.colors[cells[row, column]], rect)
+            rects.append(rect)
+        pygame.display.update(rects)
+        self.previous[rows, columns] = cells[rows, columns]
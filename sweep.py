@@ -0,0 +1,150 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+
+import numpy as np
+
+import constants
+import game
+from food_growth import FOOD_PATTERNS
+
+SWEEP_STATE_LOCATION = "data/sweep_jobs.csv"
+SWEEP_SUMMARY_LOCATION = "data/sweep_summary.csv"
+# Game arguments and organism constants that make up a configuration
+CONFIGURATION_FIELDS = ["initial_food_rate", "initial_organism_rate", "grid_size", "food_regrowth_rate",
+                        "ENERGY_FROM_EATING", "MAX_ENERGY"]
+CONFIGURATION_TYPES = [float, float, int, float, int, int]
+# Settings shared by every game of a sweep. Recorded with each job, so a sweep run again
+# with other settings doesn't pick up the results of this one
+SETTING_FIELDS = ["random", "engine", "seed", "food_pattern"]
+RESULT_FIELDS = ["steps", "peak_population", "final_population", "births"]
+
+
+def parse_values(text, cast):
+    """
+    Values of a sweep argument, either a comma separated list or start:stop:step including stop
+    """
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [cast(round(value, 10)) for value in np.linspace(start, start + step * (count - 1), count)]
+    return [cast(value) for value in text.split(",")]
+
+
+def override_constants(values):
+    """
+    Set organism constants such as ENERGY_FROM_EATING in the constants module, which the
+    game reads them from
+    """
+    for name, value in values.items():
+        if not hasattr(constants, name):
+            raise Exception("No constant named " + name)
+        setattr(constants, name, value)
+
+
+def run_job(job):
+    configuration, game_number, seed, random, engine, food_pattern = job
+    initial_food_rate, initial_organism_rate, grid_size, food_regrowth_rate, energy_from_eating, max_energy = configuration
+    override_constants({"ENERGY_FROM_EATING": energy_from_eating, "MAX_ENERGY": max_energy})
+    history, summary = game.play_game(game_number, None, seed, grid_size, initial_food_rate,
+                                      initial_organism_rate, False, random, False, False, 0, False, engine, True,
+                                      food_regrowth_rate=food_regrowth_rate, food_pattern=food_pattern)
+    return configuration, game_number, summary
+
+
+def read_finished_jobs(state_location, settings):
+    """
+    The (configuration, game) of every job recorded in the state file with the given
+    settings, with its results
+    """
+    finished = {}
+    if not os.path.exists(state_location):
+        return finished
+    with open(state_location, newline="") as statefile:
+        reader = csv.DictReader(statefile)
+        if not set(SETTING_FIELDS) <= set(reader.fieldnames or []):
+            raise Exception(state_location + " was written by an older sweep without its settings, use another --state-location")
+        for row in reader:
+            if [row[field] for field in SETTING_FIELDS] != settings:
+                continue
+            configuration = tuple(cast(row[field]) for field, cast in zip(CONFIGURATION_FIELDS, CONFIGURATION_TYPES))
+            finished[(configuration, int(row["game"]))] = {field: int(row[field]) for field in RESULT_FIELDS}
+    return finished
+
+
+def write_summary(finished, configurations, summary_location):
+    """
+    Mean results of the given configurations, leaving out others the state file has jobs of
+    """
+    configurations = {configuration: [] for configuration in configurations}
+    for (configuration, game_number), results in finished.items():
+        if configuration in configurations:
+            configurations[configuration].append(results)
+
+    with open(summary_location, "w", newline="") as summaryfile:
+        writer = csv.writer(summaryfile)
+        writer.writerow(CONFIGURATION_FIELDS + ["games"] + ["mean_" + field for field in RESULT_FIELDS])
+        for configuration in sorted(configurations):
+            games = configurations[configuration]
+            if not games:
+                continue
+            means = [round(float(np.mean([results[field] for results in games])), 2) for field in RESULT_FIELDS]
+            writer.writerow(list(configuration) + [len(games)] + means)
+
+
+def main(food_rates, organism_rates, grid_sizes, regrowth_rates, energies_from_eating, max_energies, games, workers, random, engine="grid", seed=None, state_location=SWEEP_STATE_LOCATION, summary_location=SWEEP_SUMMARY_LOCATION, food_pattern="uniform"):
+    configurations = list(itertools.product(food_rates, organism_rates, grid_sizes, regrowth_rates,
+                                            energies_from_eating, max_energies))
+    # Jobs already in the state file were finished by an earlier run of the same sweep
+    settings = [str(random), engine, str(seed), food_pattern]
+    finished = read_finished_jobs(state_location, settings)
+    jobs = [(configuration, game_number, seed, random, engine, food_pattern)
+            for configuration in configurations for game_number in range(games)
+            if (configuration, game_number) not in finished]
+    print("Sweeping " + str(len(configurations)) + " configurations, " + str(len(jobs)) + " of " +
+          str(len(configurations) * games) + " games left to play")
+
+    new_state = not os.path.exists(state_location)
+    with open(state_location, "a", newline="") as statefile:
+        writer = csv.writer(statefile)
+        if new_state:
+            writer.writerow(CONFIGURATION_FIELDS + SETTING_FIELDS + ["game"] + RESULT_FIELDS)
+        # Spawned so workers don't inherit a running tensorflow, see game.main
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers) as pool:
+            for configuration, game_number, summary in pool.imap_unordered(run_job, jobs):
+                writer.writerow(list(configuration) + settings + [game_number] + [summary[field] for field in RESULT_FIELDS])
+                # Record every job as it finishes so an interrupted sweep can pick up from here
+                statefile.flush()
+                finished[(configuration, game_number)] = summary
+
+    write_summary(finished, configurations, summary_location)
+    print("Wrote the summary of the sweep to " + summary_location)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play games for every combination of the given values. Values are "
+                                                 "comma separated lists or start:stop:step ranges")
+    parser.add_argument("--initial-food-spawn", help="Initial food spawn rates", default="0.2")
+    parser.add_argument("--initial-organism-spawn", help="Initial organism spawn rates", default="0.002")
+    parser.add_argument("--grid-size", help="Grid sizes", default="100")
+    parser.add_argument("--food-regrowth-rate", help="Chances of food growing back in an empty cell each step", default="0")
+    parser.add_argument("--food-pattern", help="Where food grows back", choices=FOOD_PATTERNS, default="uniform")
+    parser.add_argument("--energy-from-eating", help="Energy an organism gets from eating", default=None)
+    parser.add_argument("--max-energy", help="Most energy an organism can have", default=None)
+    parser.add_argument("--games", help="Games to play for every configuration", type=int, default=1)
+    parser.add_argument("--workers", help="Number of processes to play games in. Defaults to one per cpu", type=int, default=None)
+    parser.add_argument("--random", help="Randomly perform actions instead of prediction", action="store_true")
+    parser.add_argument("--engine", help="World engine", choices=["grid", "array", "chunked"], default="grid")
+    parser.add_argument("--seed", help="Seed for the random number generators. Game n is seeded with seed + n", type=int, default=None)
+    parser.add_argument("--state-location", help="Where finished jobs are recorded. Running the same sweep again resumes it", default=SWEEP_STATE_LOCATION)
+    parser.add_argument("--summary-location", help="Where to write the summary table", default=SWEEP_SUMMARY_LOCATION)
+    args = parser.parse_args()
+
+    main(parse_values(args.initial_food_spawn, float), parse_values(args.initial_organism_spawn, float),
+         parse_values(args.grid_size, int), parse_values(args.food_regrowth_rate, float),
+         parse_values(args.energy_from_eating or str(constants.ENERGY_FROM_EATING), int),
+         parse_values(args.max_energy or str(constants.MAX_ENERGY), int),
+         args.games, args.workers, args.random, args.engine, args.seed, args.state_location, args.summary_location, args.food_pattern)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import batch_step
+import game
+from batch_step import random_step, _claim_winners
+from constants import REWARD_FROM_EATING, REWARD_FROM_MOVING
+from organism import Organism
+from policies import use_policy
+from world import World, EMPTY, FOOD, ORGANISM
+
+# Actions are the four directions (column - 1, row - 1, row + 1, column + 1) to move,
+# then to eat and then to mate
+MOVE_DOWN = 2
+MOVE_LEFT, MOVE_RIGHT = 0, 3
+EAT_RIGHT = 7
+
+
+@pytest.fixture(autouse=True)
+def random_policy():
+    use_policy("random")
+
+
+def prefer(monkeypatch, *rounds):
+    """
+    Make each round of random_step pick the given action of every pending organism, when it is valid
+    """
+    calls = []
+
+    def keys(shape):
+        preferred = np.full(shape, 0.5)
+        preferred[np.arange(shape[0]), rounds[len(calls)]] = 1
+        calls.append(shape)
+        return preferred
+    monkeypatch.setattr(batch_step.np.random, "random", keys)
+    return calls
+
+
+def place(world, row, column):
+    organism = Organism(row, column)
+    world[row][column] = organism
+    return organism
+
+
+def test_claim_winners_gives_a_cell_to_the_lowest_rank():
+    # Both want cell 1, and the third organism wants the cell of the first
+    wins = _claim_winners(np.array([0, 2, 5]), np.array([1, 1, 0]), np.array([1, 0, 2]))
+    assert wins.tolist() == [False, True, False]
+
+
+def test_losing_organism_acts_again_in_the_next_round(monkeypatch):
+    world = World(3)
+    first = place(world, 0, 0)
+    second = place(world, 0, 2)
+    # Both move into (0, 1), then the one left over moves down
+    calls = prefer(monkeypatch, [MOVE_RIGHT, MOVE_LEFT], [MOVE_DOWN])
+
+    random_step(world)
+
+    assert len(calls) == 2
+    assert (first.row, first.column) == (0, 1)
+    assert (second.row, second.column) == (1, 2)
+    assert [memory[1] for memory in second.memory] == [MOVE_DOWN]
+    assert second.memory[0][2] == REWARD_FROM_MOVING
+
+
+def test_eaten_organism_is_dropped_from_pending(monkeypatch):
+    world = World(3)
+    eater = place(world, 0, 0)
+    eaten = place(world, 0, 1)
+    # The second organism loses its own cell to the first one eating it
+    calls = prefer(monkeypatch, [EAT_RIGHT, MOVE_DOWN])
+
+    random_step(world)
+
+    assert len(calls) == 1
+    assert not world.is_living(eaten)
+    assert len(eaten.memory) == 0
+    assert (eater.row, eater.column) == (0, 0)
+    assert [memory[2] for memory in eater.memory] == [REWARD_FROM_EATING]
+    assert world.organism_count == 1
+
+
+def test_free_cells_and_counts_follow_the_cells():
+    np.random.seed(3)
+    world = game.randomly_add_organisms(game.randomly_add_food(World(20), 0.3), 0.2)
+    for step in range(10):
+        random_step(world)
+
+        cells = world.cells.ravel()
+        free_cells = world.free_cells[:world.free_count]
+        assert len(set(free_cells.tolist())) == world.free_count
+        assert set(free_cells.tolist()) == set(np.flatnonzero(cells == EMPTY).tolist())
+        assert np.array_equal(world.free_position[free_cells], np.arange(world.free_count))
+        assert world.organism_count == np.count_nonzero(cells == ORGANISM)
+        assert world.food_count == np.count_nonzero(cells == FOOD)
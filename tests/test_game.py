@@ -0,0 +1,28 @@
+import csv
+
+from constants import BATCH_SIZE
+from game import add_file_information_to_name, index_file_name, read_from_csv, write_to_csv
+
+
+def records(organism_id, reward):
+    return [[organism_id] + [0] * 24 + [1, reward] + [0] * 24 + [False] for step in range(BATCH_SIZE)]
+
+
+def test_write_to_csv_keeps_rows_of_an_unindexed_log(tmp_path):
+    location = str(tmp_path / "life.csv")
+    filename = add_file_information_to_name(location, 0.2, 0.002, 10)
+    # A log written before the index existed
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        writer.writerows(records("old-1", 3))
+        writer.writerows(records("old-2", -1))
+
+    write_to_csv({"new": records("new", 5)}, location, 0.2, 0.002, 10)
+
+    with open(index_file_name(filename), newline='') as indexfile:
+        assert [row[0] for row in csv.reader(indexfile)] == ["old-1", "old-2", "new"]
+    memories = read_from_csv(location, 0.2, 0.002, 10, 3)
+    assert sorted(memories) == ["new", "old-1", "old-2"]
+    assert len(memories["old-2"]) == BATCH_SIZE
+    assert memories["old-2"][0][2] == -1
+    assert memories["new"][0][2] == 5
@@ -0,0 +1,37 @@
+import csv
+
+import numpy as np
+import pygame
+
+import play_game_log
+from renderer import CELL_COLORS, CELL_WIDTH, CELL_HEIGHT
+
+
+def test_replays_an_old_csv_log(tmp_path, monkeypatch):
+    grid_size = 5
+    # The old writer logged (grid_size - 1) square frames, one row literal per cell
+    frames = [[[(row + column + step) % 3 for column in range(grid_size - 1)] for row in range(grid_size - 1)]
+              for step in range(3)]
+    log_file = tmp_path / "game_log.csv"
+    with open(log_file, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        for frame in frames:
+            writer.writerow([str(row) for row in frame])
+    arguments_file = tmp_path / "arguments.csv"
+    arguments_file.write_text("{},0.2,0.002,True,,5\n".format(grid_size))
+    # Play as fast as possible and keep the window open to look at the last frame
+    monkeypatch.setattr(play_game_log, "FRAME_RATE", 0)
+    monkeypatch.setattr(pygame, "quit", lambda: None)
+
+    play_game_log.main(str(arguments_file), str(log_file))
+
+    try:
+        screen = pygame.display.get_surface()
+        assert screen.get_size() == ((grid_size - 1) * CELL_WIDTH, (grid_size - 1) * CELL_HEIGHT)
+        # Surfaces are indexed (x, y), which is (row, column) like the grid
+        pixels = pygame.surfarray.array3d(screen)
+        centers = pixels[CELL_WIDTH // 2::CELL_WIDTH, CELL_HEIGHT // 2::CELL_HEIGHT]
+        assert np.array_equal(centers, CELL_COLORS[np.array(frames[-1])])
+    finally:
+        monkeypatch.undo()
+        pygame.quit()
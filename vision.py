@@ -0,0 +1,56 @@
+import numpy as np
+
+VISION_RANGE = 2
+OUT_OF_BOUNDS = -1
+# Cell type (empty, food, organism) to the int mapping organisms see
+VISION_CODES = np.array([0, 2, 1], dtype=np.int8)
+# Offsets of the 24 visible tiles, in the order Organism._get_visible_tiles returns them
+VISION_OFFSETS = np.array([(row_change, col_change)
+                           for row_change in range(-VISION_RANGE, VISION_RANGE + 1)
+                           for col_change in range(-VISION_RANGE, VISION_RANGE + 1)
+                           if row_change != 0 or col_change != 0])
+VISION_OFFSET_LIST = [tuple(offset) for offset in VISION_OFFSETS.tolist()]
+VISION_ROWS = VISION_OFFSETS[:, 0] + VISION_RANGE
+VISION_COLUMNS = VISION_OFFSETS[:, 1] + VISION_RANGE
+
+
+class Vision:
+    """
+    Copy of the world encoded the way organisms see it, with a border of -1 around it so
+    the visible tiles of any number of organisms are a single gather with no bounds checks.
+    Kept up to date by the World on every cell change.
+    """
+    def __init__(self, grid_size):
+        self.padded = np.full((grid_size + 2 * VISION_RANGE, grid_size + 2 * VISION_RANGE), OUT_OF_BOUNDS, dtype=np.int8)
+        self.padded[VISION_RANGE:-VISION_RANGE, VISION_RANGE:-VISION_RANGE] = VISION_CODES[0]
+        # Bumped on every change so observations can tell if they are stale
+        self.version = 0
+
+    def update(self, rows, columns, cell_types):
+        self.padded[rows + VISION_RANGE, columns + VISION_RANGE] = VISION_CODES[cell_types]
+        self.version += 1
+
+    def observe(self, rows, columns):
+        """
+        The (N, 24) visible tiles of organisms at the given positions
+        """
+        rows = np.asarray(rows, dtype=int)
+        columns = np.asarray(columns, dtype=int)
+        return self.padded[rows[:, None] + VISION_ROWS, columns[:, None] + VISION_COLUMNS].astype(int)
+
+
+def grid_visible_tiles(game_grid, organism_row, organism_column, convert):
+    """
+    The visible tiles of a position on the list of lists grid
+    """
+    grid_rows = len(game_grid)
+    grid_columns = len(game_grid[0])
+    visible = []
+    for row_change, col_change in VISION_OFFSET_LIST:
+        row = organism_row + row_change
+        column = organism_column + col_change
+        if 0 <= row < grid_rows and 0 <= column < grid_columns:
+            visible.append(convert(game_grid[row][column]))
+        else:
+            visible.append(OUT_OF_BOUNDS)
+    return np.array(visible).reshape((1, 24))
@@ -0,0 +1,343 @@
+import numpy as np
+
+from food import Food
+from vision import Vision
+
+# Cell types stored in World.cells. Matches the values written by convert_game_state
+EMPTY = 0
+FOOD = 1
+ORGANISM = 2
+INITIAL_CAPACITY = 64
+
+
+class WorldField:
+    """
+    Organism attribute that is kept on the organism until it is placed in a World,
+    after which it is read from and written to the world's per-slot arrays
+    """
+    def __init__(self, cast):
+        self.cast = cast
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+
+    def __get__(self, organism, owner=None):
+        if organism is None:
+            return self
+        if organism.world is None:
+            return organism.__dict__[self.private_name]
+        return self.cast(getattr(organism.world, self.name)[organism.slot])
+
+    def __set__(self, organism, value):
+        if organism.world is None:
+            organism.__dict__[self.private_name] = value
+        else:
+            getattr(organism.world, self.name)[organism.slot] = value
+
+
+class WorldRow:
+    """
+    A single row of a World, so that game_grid[row][column] reads and writes work the
+    same as they do on the list of lists grid
+    """
+    def __init__(self, world, row):
+        self.world = world
+        self.row = row
+
+    def __len__(self):
+        return self.world.grid_size
+
+    def __getitem__(self, column):
+        return self.world.get(self.row, column)
+
+    def __setitem__(self, column, obj):
+        self.world.set(self.row, column, obj)
+
+
+class World:
+    """
+    Array backed game grid. Cell types are kept in an int8 array and organism state
+    (row, column, energy, alive, genome index) in parallel arrays indexed by slot, so
+    whole world passes can be done with numpy instead of walking every cell.
+    Organisms are bound to a slot when placed and read their state from these arrays.
+    Food has no state of its own and is handed out as a view of the cell when read.
+
+    Every cell change goes through _write, which keeps the registry of organisms on the
+    grid, the organism and food counts and the index of free cells up to date, so
+    finding the living organisms or an empty cell never needs a scan of the grid.
+    """
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        self.cells = np.zeros((grid_size, grid_size), dtype=np.int8)
+        # Slot of the organism in each cell, -1 if there is none
+        self.occupant = np.full((grid_size, grid_size), -1, dtype=np.int32)
+        self.vision = Vision(grid_size)
+        # Flat indexes of the empty cells in free_cells[:free_count] and the position of each
+        # cell in free_cells, -1 if it isn't empty. Removal swaps the last free cell into the hole
+        self.free_cells = np.arange(grid_size * grid_size)
+        self.free_position = np.arange(grid_size * grid_size)
+        self.free_count = grid_size * grid_size
+        self._init_slots()
+        self._rows = [WorldRow(self, row) for row in range(grid_size)]
+
+    def _init_slots(self):
+        # Visible tiles last computed for many organisms at once, see observe_slots
+        self._observed = None
+
+        # Organism state by slot
+        self.row = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.column = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.energy = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.genome_index = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        # Registry of the slots whose organism is currently on the grid
+        self.on_grid = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        # Slots that hold an organism, on the grid or waiting to be collected
+        self.bound = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.organisms = [None] * INITIAL_CAPACITY
+        self.free_slots = []
+        self.slots_used = 0
+        self.organism_count = 0
+        self.food_count = 0
+
+        # Genome hash to index into genome_hashes
+        self.genome_indexes = {}
+        self.genome_hashes = []
+
+    def __len__(self):
+        return self.grid_size
+
+    def __getitem__(self, row):
+        return self._rows[row]
+
+    def get(self, row, column):
+        cell = self.cells[row, column]
+        if cell == ORGANISM:
+            return self.organisms[self.occupant[row, column]]
+        elif cell == FOOD:
+            return Food(row, column)
+        return None
+
+    def set(self, row, column, obj):
+        if obj is None:
+            self._write([row], [column], EMPTY)
+        elif type(obj) == Food:
+            self._write([row], [column], FOOD)
+        else:
+            if obj.world is not self:
+                self._bind(obj)
+            self._write([row], [column], ORGANISM, [obj.slot])
+
+    def _write(self, rows, columns, cell_type, slots=-1):
+        """
+        Set cells to one cell type, keeping the registry, counts and vision in sync
+        """
+        previous = self.cells[rows, columns]
+        flat = np.asarray(rows, dtype=np.int64) * self.grid_size + np.asarray(columns)
+        if cell_type == EMPTY:
+            self._add_free(flat[previous != EMPTY])
+        else:
+            self._take_free(flat[previous == EMPTY])
+        previous_slots = self.occupant[rows, columns][previous == ORGANISM]
+        self.on_grid[previous_slots] = False
+        self.organism_count -= len(previous_slots)
+        self.food_count -= int(np.count_nonzero(previous == FOOD))
+
+        self.cells[rows, columns] = cell_type
+        self.occupant[rows, columns] = slots
+        if cell_type == ORGANISM:
+            self.on_grid[slots] = True
+            self.row[slots] = rows
+            self.column[slots] = columns
+            self.organism_count += len(rows)
+        elif cell_type == FOOD:
+            self.food_count += len(rows)
+        self.vision.update(np.asarray(rows), np.asarray(columns), cell_type)
+
+    def _add_free(self, flat):
+        self.free_cells[self.free_count:self.free_count + len(flat)] = flat
+        self.free_position[flat] = np.arange(self.free_count, self.free_count + len(flat))
+        self.free_count += len(flat)
+
+    def _take_free(self, flat):
+        positions = self.free_position[flat]
+        self.free_position[flat] = -1
+        new_count = self.free_count - len(flat)
+        # Fill the holes left below the new count with the free cells kept from above it
+        holes = positions[positions < new_count]
+        tail = self.free_cells[new_count:self.free_count]
+        kept = tail[self.free_position[tail] != -1]
+        self.free_cells[holes] = kept
+        self.free_position[kept] = holes
+        self.free_count = new_count
+
+    def order_free_cells(self, free_cells):
+        """
+        Put the free cells in the given order of flat indexes, which must be exactly the
+        empty cells. Used to restore a saved world so random picks land on the same cells
+        """
+        self.free_cells[:self.free_count] = free_cells
+        self.free_position[free_cells] = np.arange(self.free_count)
+
+    def random_free_cell(self):
+        """
+        A random empty cell as (row, column), None if the grid is full
+        """
+        if self.free_count == 0:
+            return None
+        flat = int(self.free_cells[np.random.randint(self.free_count)])
+        return flat // self.grid_size, flat % self.grid_size
+
+    def add_food(self, mask):
+        """
+        Place food in every empty cell where mask is True
+        """
+        rows, columns = np.nonzero(mask & (self.cells == EMPTY))
+        self._write(rows, columns, FOOD)
+
+    def place_food(self, rows, columns):
+        """
+        Place food in the given empty cells
+        """
+        self._write(rows, columns, FOOD)
+
+    def occupants(self, rows, columns):
+        """
+        Slots of the organisms at the given positions, -1 where there is none
+        """
+        return self.occupant[rows, columns]
+
+    def cell_types(self, rows, columns):
+        """
+        Cell types at the given positions, -1 for positions outside of the grid
+        """
+        inside = (rows >= 0) & (rows < self.grid_size) & (columns >= 0) & (columns < self.grid_size)
+        types = np.full(rows.shape, -1, dtype=np.int8)
+        types[inside] = self.cells[rows[inside], columns[inside]]
+        return types
+
+    def observations(self, rows, columns):
+        """
+        The (N, 24) visible tiles of organisms at the given positions
+        """
+        return self.vision.observe(rows, columns)
+
+    def observe_slots(self, slots):
+        """
+        The (N, 24) visible tiles of the organisms in slots. Remembered until the world
+        changes, so visible_tiles can hand out rows of it
+        """
+        visible_tiles = self.vision.observe(self.row[slots], self.column[slots])
+        rows = {slot: index for index, slot in enumerate(np.asarray(slots).tolist())}
+        self._observed = (self.vision.version, rows, visible_tiles)
+        return visible_tiles
+
+    def visible_tiles(self, organism):
+        """
+        The (1, 24) visible tiles of one organism, as a view into the last observe_slots
+        result when the world hasn't changed since
+        """
+        if self._observed and self._observed[0] == self.vision.version and organism.slot in self._observed[1]:
+            index = self._observed[1][organism.slot]
+            return self._observed[2][index:index + 1]
+        return self.vision.observe([organism.row], [organism.column])
+
+    def random_empty_cells(self, count):
+        """
+        Up to count distinct empty cells as (rows, columns)
+        """
+        count = min(count, self.free_count)
+        positions = np.unique(np.random.randint(0, self.free_count, count))
+        while len(positions) < count:
+            extra = np.random.randint(0, self.free_count, count - len(positions))
+            positions = np.unique(np.concatenate([positions, extra]))
+        chosen = self.free_cells[np.random.permutation(positions)]
+        return chosen // self.grid_size, chosen % self.grid_size
+
+    def clear_cells(self, rows, columns):
+        self._write(rows, columns, EMPTY)
+
+    def move_organisms(self, slots, rows, columns):
+        """
+        Move the organisms in slots to the given empty cells
+        """
+        self.clear_cells(self.row[slots], self.column[slots])
+        self._write(rows, columns, ORGANISM, slots)
+
+    def kill_organisms(self, slots):
+        self.alive[slots] = False
+        self.clear_cells(self.row[slots], self.column[slots])
+
+    def _bind(self, organism):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.slots_used == len(self.organisms):
+                self._grow()
+            slot = self.slots_used
+            self.slots_used += 1
+
+        self.row[slot] = organism.row
+        self.column[slot] = organism.column
+        self.energy[slot] = organism.energy
+        self.alive[slot] = organism.alive
+        self.genome_index[slot] = self._genome_index(organism.genome.hash)
+        self.bound[slot] = True
+        self.organisms[slot] = organism
+        organism.world = self
+        organism.slot = slot
+
+    def _release(self, slot):
+        organism = self.organisms[slot]
+        # Hand the state back to the organism so it stays readable once unbound
+        state = (organism.row, organism.column, organism.energy, organism.alive)
+        organism.world = None
+        organism.slot = None
+        organism.row, organism.column, organism.energy, organism.alive = state
+
+        self.alive[slot] = False
+        self.bound[slot] = False
+        self.organisms[slot] = None
+        self.free_slots.append(slot)
+
+    def _grow(self):
+        capacity = len(self.organisms) * 2
+        for name in ("row", "column", "energy", "alive", "genome_index", "on_grid", "bound"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.organisms.extend([None] * (capacity - len(self.organisms)))
+
+    def _genome_index(self, genome_hash):
+        if genome_hash not in self.genome_indexes:
+            self.genome_indexes[genome_hash] = len(self.genome_hashes)
+            self.genome_hashes.append(genome_hash)
+        return self.genome_indexes[genome_hash]
+
+    def living_slots(self):
+        """
+        Slots of the organisms on the grid, in row major order of their position.
+        This is the order the step functions let organisms act in
+        """
+        slots = np.flatnonzero(self.on_grid[:self.slots_used])
+        order = np.argsort(self.row[slots].astype(np.int64) * self.grid_size + self.column[slots], kind="stable")
+        return slots[order]
+
+    def is_living(self, organism):
+        return organism.world is self and self.on_grid[organism.slot]
+
+    def living_organisms(self):
+        return [self.organisms[slot] for slot in self.living_slots().tolist()]
+
+    def population(self):
+        return self.organism_count
+
+    def collect(self):
+        """
+        Release the slots of organisms that have died or been eaten since the last call
+        """
+        gone = self.bound[:self.slots_used] & ~self.on_grid[:self.slots_used]
+        for slot in np.flatnonzero(gone).tolist():
+            self._release(slot)